@@ -0,0 +1,205 @@
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cek_koordinat_engine import IndeksPangkalan, read_upload
+
+RADIUS_DEFAULT = 100
+RADIUS_MAKS = 50_000
+
+class LayananIndeks:
+    def __init__(self):
+        self.indeks = None
+        self.sumber = None
+        self.dimuat = None
+        self.direktori_data = None
+        self._lock = threading.Lock()
+
+    def muat(self, data, encoding="utf-8", sumber=None):
+        indeks = IndeksPangkalan(read_upload(data, encoding))
+        with self._lock:
+            self.indeks = indeks
+            self.sumber = sumber
+            self.dimuat = time.strftime("%Y-%m-%d %H:%M:%S")
+        return indeks
+
+    def muat_file(self, path, encoding="utf-8", sumber=None):
+        with open(path, "rb") as f:
+            return self.muat(f.read(), encoding, sumber=sumber or path)
+
+    def path_data(self, path):
+        # /reload?path= hanya boleh membaca file di dalam direktori data yang dikonfigurasi
+        if self.direktori_data is None:
+            raise PermissionError("direktori data belum dikonfigurasi")
+        direktori = os.path.realpath(self.direktori_data)
+        path = os.path.realpath(os.path.join(direktori, path))
+        if os.path.commonpath([direktori, path]) != direktori or not os.path.isfile(path):
+            raise PermissionError("path di luar direktori data")
+        return path
+
+layanan = LayananIndeks()
+
+def _json_default(obj):
+    return obj.item() if hasattr(obj, "item") else str(obj)
+
+def _angka(nilai, minimum=-math.inf, maksimum=math.inf):
+    angka = float(nilai)
+    if not (math.isfinite(angka) and minimum <= angka <= maksimum):
+        raise ValueError(f"{nilai!r} bukan angka terhingga dalam rentang {minimum}..{maksimum}")
+    return angka
+
+def _lat(nilai):
+    return _angka(nilai, -90, 90)
+
+def _lon(nilai):
+    return _angka(nilai, -180, 180)
+
+def _radius(nilai):
+    radius = _angka(nilai, 0, RADIUS_MAKS)
+    if radius == 0:
+        raise ValueError("radius harus lebih dari 0")
+    return radius
+
+def _objek(data):
+    if not isinstance(data, dict):
+        raise TypeError("body harus berupa objek JSON")
+    return data
+
+class Handler(BaseHTTPRequestHandler):
+    def _kirim(self, status, data):
+        body = json.dumps(data, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _baca_body(self):
+        panjang = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(panjang)
+
+    def _indeks(self):
+        indeks = layanan.indeks
+        if indeks is None:
+            self._kirim(503, {"error": "Data pangkalan belum dimuat, panggil /reload terlebih dahulu"})
+        return indeks
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            indeks = layanan.indeks
+            self._kirim(200, {
+                "status": "ok",
+                "jumlah_pangkalan": len(indeks) if indeks is not None else 0,
+                "sumber": layanan.sumber,
+                "dimuat": layanan.dimuat
+            })
+        elif url.path == "/cek":
+            indeks = self._indeks()
+            if indeks is None:
+                return
+            query = parse_qs(url.query)
+            try:
+                lat = _lat(query["lat"][0])
+                lon = _lon(query["lon"][0])
+                radius = _radius(query.get("radius", [RADIUS_DEFAULT])[0])
+            except (KeyError, ValueError):
+                self._kirim(400, {"error": f"Parameter lat (-90..90), lon (-180..180) dan opsional radius "
+                                           f"(0 < radius <= {RADIUS_MAKS} meter) harus berupa angka"})
+                return
+            pangkalan = indeks.cari_radius(lat, lon, radius)
+            self._kirim(200, {"lat": lat, "lon": lon, "radius_m": radius,
+                              "jumlah": len(pangkalan), "pangkalan": pangkalan})
+        else:
+            self._kirim(404, {"error": f"Endpoint {url.path} tidak ditemukan"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/cek-batch":
+            indeks = self._indeks()
+            if indeks is None:
+                return
+            try:
+                permintaan = _objek(json.loads(self._baca_body() or b"{}"))
+                radius = _radius(permintaan.get("radius", RADIUS_DEFAULT))
+                titik = permintaan["titik"]
+                lat = [_lat(t["lat"]) for t in titik]
+                lon = [_lon(t["lon"]) for t in titik]
+            except (KeyError, TypeError, ValueError):
+                self._kirim(400, {"error": 'Body harus berupa JSON {"radius": 100, "titik": [{"lat": .., "lon": ..}]} '
+                                           f'dengan lat -90..90, lon -180..180 dan 0 < radius <= {RADIUS_MAKS}'})
+                return
+            hasil = indeks.cari_radius_batch(lat, lon, radius) if titik else []
+            self._kirim(200, {"radius_m": radius, "hasil": [
+                {"lat": la, "lon": lo, "jumlah": len(pangkalan), "pangkalan": pangkalan}
+                for la, lo, pangkalan in zip(lat, lon, hasil)
+            ]})
+        elif url.path == "/terdekat":
+            indeks = self._indeks()
+            if indeks is None:
+                return
+            try:
+                titik = _objek(json.loads(self._baca_body() or b"{}"))["titik"]
+                lat = [_lat(t["lat"]) for t in titik]
+                lon = [_lon(t["lon"]) for t in titik]
+            except (KeyError, TypeError, ValueError):
+                self._kirim(400, {"error": 'Body harus berupa JSON {"titik": [{"lat": .., "lon": ..}]} '
+                                           'dengan lat -90..90 dan lon -180..180'})
+                return
+            hasil = []
+            if titik:
+                idx, jarak = indeks.terdekat(lat, lon)
+                hasil = [indeks.info_pangkalan(i, j) for i, j in zip(idx, jarak)]
+            self._kirim(200, {"hasil": [
+                {"lat": la, "lon": lo, "terdekat": pangkalan} for la, lo, pangkalan in zip(lat, lon, hasil)
+            ]})
+        elif url.path == "/reload":
+            query = parse_qs(url.query)
+            encoding = query.get("encoding", ["utf-8"])[0]
+            if "path" in query:
+                try:
+                    path = layanan.path_data(query["path"][0])
+                except PermissionError:
+                    self._kirim(403, {"error": "Path harus berupa file di dalam direktori data (--data-dir)"})
+                    return
+                try:
+                    indeks = layanan.muat_file(path, encoding, sumber=query["path"][0])
+                except Exception:
+                    # isi pesan error tidak dikirim agar struktur file server tidak bocor ke klien
+                    self._kirim(400, {"error": "Gagal memuat data pangkalan dari path tersebut"})
+                    return
+            else:
+                try:
+                    indeks = layanan.muat(self._baca_body(), encoding, sumber="upload")
+                except Exception as e:
+                    self._kirim(400, {"error": f"Gagal memuat data pangkalan: {e}"})
+                    return
+            self._kirim(200, {"status": "ok", "jumlah_pangkalan": len(indeks), "sumber": layanan.sumber})
+        else:
+            self._kirim(404, {"error": f"Endpoint {url.path} tidak ditemukan"})
+
+def main():
+    parser = argparse.ArgumentParser(description="Layanan HTTP/JSON cek jarak pangkalan LPG 3 Kg")
+    parser.add_argument("csv", nargs="?", help="File CSV pangkalan (format template)")
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-dir", default=os.environ.get("CEK_KOORDINAT_DATA_DIR"),
+                        help="direktori yang boleh dibaca lewat /reload?path= (tanpa ini hanya upload body)")
+    args = parser.parse_args()
+    layanan.direktori_data = args.data_dir
+
+    if args.csv:
+        indeks = layanan.muat_file(args.csv, args.encoding)
+        print(f"{len(indeks)} pangkalan dimuat dari {args.csv}")
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Layanan berjalan di http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1530 @@
+import datetime
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+from array import array
+from zipfile import ZipFile
+
+import numpy as np
+import pandas as pd
+
+# python-docx, networkx, scipy, numba, pyarrow dan PyYAML diimpor di dalam fungsi yang memakainya agar start aplikasi tetap cepat
+NUMBA_TERSEDIA = importlib.util.find_spec("numba") is not None
+PYARROW_TERSEDIA = importlib.util.find_spec("pyarrow") is not None
+
+soldtoparty_index = 0
+nama_agen_index = 1
+nama_pangkalan_index = 2
+provinsi_index = 3
+kota_index = 4
+kecamatan_index = 5
+lat_index = 8
+lon_index = 9
+
+PRESISI_KOORDINAT_IDENTIK = 5
+
+LAT_INDONESIA = (-11.1, 6.1)
+LON_INDONESIA = (94.9, 141.1)
+
+DMS_PATTERN = (
+    r"^\s*(?P<hemi1>LU|LS|BT|BB|[NSEWUTB])?\s*"
+    r"(?P<deg>-?\d+(?:[.,]\d+)?)\s*(?:°|º|˚|\s|(?=\s*(?:LU|LS|BT|BB|[NSEWUTB])?\s*$))\s*"
+    r"(?:(?P<min>\d+(?:[.,]\d+)?)\s*(?:'|′|’|\s)?\s*)?"
+    r"(?:(?P<sec>\d+(?:[.,]\d+)?)\s*(?:\"|″|”|'')?\s*)?"
+    r"(?P<hemi2>LU|LS|BT|BB|[NSEWUTB])?\s*$"
+)
+HEMISFER_NEGATIF = ("S", "W", "LS", "BB", "B")
+HEMISFER_LAT = ("N", "S", "LU", "LS")
+HEMISFER_LON = ("E", "W", "BT", "BB", "T", "B")
+
+WILAYAH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wilayah_bbox.csv")
+PROFIL_SURAT_DIR = os.environ.get("CEK_KOORDINAT_PROFIL_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "profil_surat")
+TOLERANSI_WILAYAH = 0.05
+ALIAS_WILAYAH = {
+    "JAKARTA": "DKI JAKARTA",
+    "DAERAH KHUSUS IBUKOTA JAKARTA": "DKI JAKARTA",
+    "YOGYAKARTA": "DI YOGYAKARTA",
+    "DAERAH ISTIMEWA YOGYAKARTA": "DI YOGYAKARTA",
+    "NANGGROE ACEH DARUSSALAM": "ACEH",
+    "KEP RIAU": "KEPULAUAN RIAU",
+    "BANGKA BELITUNG": "KEPULAUAN BANGKA BELITUNG",
+    "KEP BANGKA BELITUNG": "KEPULAUAN BANGKA BELITUNG",
+    "NTB": "NUSA TENGGARA BARAT",
+    "NTT": "NUSA TENGGARA TIMUR",
+}
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+AMBANG_PEMBULATAN = 1e-6
+
+def _jarak_window_kernel(lat, lon, kode, slider_max, batas_meter, buffer, ambigu, pair_awal, pair_akhir, pair_jarak,
+                         pair_d):
+    # pasangan dicatat di lintasan yang sama selama muat di array pasangan; jumlah sebenarnya tetap dihitung
+    R = 6371.0
+    n = lat.shape[0]
+    kapasitas = pair_awal.shape[0]
+    k = 0
+    for d in range(1, slider_max + 1):
+        for i in range(n):
+            if i < d:
+                buffer[d - 1, i] = np.nan
+                continue
+            if lat[i - d] == lat[i] and lon[i - d] == lon[i]:
+                jarak_meter = 0.0
+            else:
+                phi1, phi2 = math.radians(lat[i - d]), math.radians(lat[i])
+                dphi = math.radians(lat[i] - lat[i - d])
+                dlambda = math.radians(lon[i] - lon[i - d])
+                a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
+                c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+                skala = R * c * 1000 * 100
+                sisa = skala - math.floor(skala)
+                ambigu[d - 1, i] = abs(sisa - 0.5) < AMBANG_PEMBULATAN
+                jarak_meter = np.rint(skala) / 100
+            buffer[d - 1, i] = jarak_meter
+            if jarak_meter < batas_meter and (kode[i] < 0 or kode[i] != kode[i - d]):
+                if k < kapasitas:
+                    pair_awal[k] = i - d
+                    pair_akhir[k] = i
+                    pair_jarak[k] = jarak_meter
+                    pair_d[k] = d
+                k += 1
+    return k
+
+def _pasangan_kernel(buffer, kode, batas_meter, pair_awal, pair_akhir, pair_jarak, pair_d):
+    # hanya untuk buffer yang dikoreksi setelah kernel jarak; dengan array kosong hanya menghitung jumlah pasangan
+    kapasitas = pair_awal.shape[0]
+    k = 0
+    for d in range(1, buffer.shape[0] + 1):
+        for i in range(d, buffer.shape[1]):
+            jarak_meter = buffer[d - 1, i]
+            if jarak_meter < batas_meter and (kode[i] < 0 or kode[i] != kode[i - d]):
+                if k < kapasitas:
+                    pair_awal[k] = i - d
+                    pair_akhir[k] = i
+                    pair_jarak[k] = jarak_meter
+                    pair_d[k] = d
+                k += 1
+    return k
+
+_jarak_window_numba = None
+_pasangan_numba = None
+
+def _kernel_numba():
+    global _jarak_window_numba, _pasangan_numba
+    if _jarak_window_numba is None:
+        import numba
+        _jarak_window_numba = numba.njit(cache=True)(_jarak_window_kernel)
+        _pasangan_numba = numba.njit(cache=True)(_pasangan_kernel)
+    return _jarak_window_numba
+
+def _pasangan_dari_buffer_numba(buffer, kode, batas_meter, k=None):
+    if k is None:
+        kosong = np.empty(0, dtype=np.int64)
+        k = _pasangan_numba(buffer, kode, float(batas_meter), kosong, kosong, np.empty(0), kosong)
+    pasangan = (np.empty(k, dtype=np.int64), np.empty(k, dtype=np.int64), np.empty(k), np.empty(k, dtype=np.int64))
+    _pasangan_numba(buffer, kode, float(batas_meter), *pasangan)
+    return pasangan
+
+def _pasangan_dari_buffer(buffer, kode, batas_meter):
+    beda_identik = np.ones(buffer.shape, dtype=bool)
+    for d in range(1, buffer.shape[0] + 1):
+        beda_identik[d - 1, d:] = (kode[d:] < 0) | (kode[d:] != kode[:-d])
+    dd, ii = np.nonzero((buffer < batas_meter) & beda_identik)
+    return ii - (dd + 1), ii, buffer[dd, ii], dd + 1
+
+def _jarak_window_numpy(lat, lon, kode, slider_max, batas_meter):
+    n = len(lat)
+    buffer = np.full((slider_max, n), np.nan)
+    ambigu = np.zeros((slider_max, n), dtype=bool)
+    for d in range(1, min(slider_max, n - 1) + 1):
+        skala = haversine_np(lat[:-d], lon[:-d], lat[d:], lon[d:]) * 1000 * 100
+        ambigu[d - 1, d:] = np.abs(skala - np.floor(skala) - 0.5) < AMBANG_PEMBULATAN
+        buffer[d - 1, d:] = np.rint(skala) / 100
+    return buffer, ambigu, _pasangan_dari_buffer(buffer, kode, batas_meter)
+
+def hitung_jarak_window(lat, lon, kode, slider_max, batas_meter, pakai_numba=None):
+    lat = np.ascontiguousarray(lat, dtype=np.float64)
+    lon = np.ascontiguousarray(lon, dtype=np.float64)
+    kode = np.ascontiguousarray(kode, dtype=np.int64)
+    if pakai_numba is None:
+        pakai_numba = NUMBA_TERSEDIA
+    if pakai_numba:
+        n = len(lat)
+        buffer = np.empty((slider_max, n))
+        ambigu = np.zeros((slider_max, n), dtype=bool)
+        pasangan = (np.empty(n, dtype=np.int64), np.empty(n, dtype=np.int64), np.empty(n), np.empty(n, dtype=np.int64))
+        k = _kernel_numba()(lat, lon, kode, slider_max, float(batas_meter), buffer, ambigu, *pasangan)
+        if k <= n:
+            pasangan = tuple(kolom[:k] for kolom in pasangan)
+        else:
+            pasangan = _pasangan_dari_buffer_numba(buffer, kode, batas_meter, k)
+    else:
+        buffer, ambigu, pasangan = _jarak_window_numpy(lat, lon, kode, slider_max, batas_meter)
+
+    # nilai yang tepat di tengah pembulatan dihitung ulang dengan haversine() + round() agar identik
+    berubah = False
+    for dd, i in zip(*np.nonzero(ambigu)):
+        d = dd + 1
+        jarak_meter = round(haversine(lat[i - d], lon[i - d], lat[i], lon[i]) * 1000, 2)
+        if jarak_meter != buffer[dd, i]:
+            buffer[dd, i] = jarak_meter
+            berubah = True
+    if berubah:
+        pasangan = (_pasangan_dari_buffer_numba if pakai_numba else _pasangan_dari_buffer)(buffer, kode, batas_meter)
+    return buffer, pasangan
+
+def is_valid_coordinate(coord):
+    if pd.isna(coord):
+        return False, "Nilai kosong"
+    if isinstance(coord, str):
+        coord = coord.strip().replace(",", ".").replace('"', "").replace("'", "").upper()
+        if coord in ("", "NULL", "NA", "N/A", "NONE", "-"):
+            return False, "Nilai kosong atau tidak valid"
+        if re.search(r"[^0-9.\-]", coord):
+            return False, "Mengandung karakter tidak valid (spasi/tanda baca)"
+        try:
+            float(coord)
+            return True, ""
+        except:
+            return False, "Format angka tidak valid"
+    try:
+        float(coord)
+        return True, ""
+    except:
+        return False, "Format angka tidak valid"
+
+def find_identical_coordinates(koordinat, presisi=PRESISI_KOORDINAT_IDENTIK):
+    kelompok = {}
+    for i, (lat, lon) in enumerate(koordinat):
+        if math.isnan(lat) or math.isnan(lon):
+            continue
+        kelompok.setdefault((round(lat, presisi), round(lon, presisi)), []).append(i)
+    kode = [-1] * len(koordinat)
+    identik = []
+    for rows in kelompok.values():
+        if len(rows) > 1:
+            for i in rows:
+                kode[i] = len(identik)
+            identik.append(rows)
+    return identik, kode
+
+def hilbert_order(koordinat, order=16):
+    lat, lon = np.asarray(koordinat, dtype=np.float64).T
+    skala = (1 << order) - 1
+
+    def normalisasi(v):
+        if np.isnan(v).all():
+            return np.zeros(len(v), dtype=np.int64)
+        v = np.where(np.isnan(v), np.nanmin(v), v)
+        rentang = v.max() - v.min()
+        if rentang == 0:
+            return np.zeros(len(v), dtype=np.int64)
+        return ((v - v.min()) / rentang * skala).astype(np.int64)
+
+    x, y = normalisasi(lon), normalisasi(lat)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = 1 << (order - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        tukar = ~ry
+        balik = tukar & rx
+        x = np.where(balik, skala - x, x)
+        y = np.where(balik, skala - y, y)
+        x, y = np.where(tukar, y, x), np.where(tukar, x, y)
+        s >>= 1
+    return np.argsort(d, kind="stable")
+
+def format_agent_name(name):
+    if name.startswith("PT. "):
+        after_pt = name[4:].strip()
+        words = after_pt.split()
+        formatted_words = [word.capitalize() for word in words]
+        return "PT. " + " ".join(formatted_words)
+    else:
+        words = name.split()
+        formatted_words = [word.capitalize() for word in words]
+        return " ".join(formatted_words)
+
+class PairStore:
+    __slots__ = ("baris_1", "baris_2", "jarak", "field_jarak")
+
+    def __init__(self):
+        self.baris_1 = array("q")
+        self.baris_2 = array("q")
+        self.jarak = array("f")
+        self.field_jarak = array("h")
+
+    def __len__(self):
+        return len(self.jarak)
+
+    def add(self, baris_1, baris_2, jarak, field_jarak):
+        self.baris_1.append(baris_1)
+        self.baris_2.append(baris_2)
+        self.jarak.append(jarak)
+        self.field_jarak.append(field_jarak)
+
+    def add_many(self, baris_1, baris_2, jarak, field_jarak):
+        self.baris_1.frombytes(np.asarray(baris_1, dtype=np.int64).tobytes())
+        self.baris_2.frombytes(np.asarray(baris_2, dtype=np.int64).tobytes())
+        self.jarak.frombytes(np.asarray(jarak, dtype=np.float32).tobytes())
+        self.field_jarak.frombytes(np.asarray(field_jarak, dtype=np.int16).tobytes())
+
+    def extend(self, other, offset=0):
+        self.baris_1.extend(b + offset for b in other.baris_1)
+        self.baris_2.extend(b + offset for b in other.baris_2)
+        self.jarak.extend(other.jarak)
+        self.field_jarak.extend(other.field_jarak)
+
+    def rows(self, awal=0, akhir=None):
+        return zip(self.baris_1[awal:akhir], self.baris_2[awal:akhir])
+
+    def mask_terlibat(self, n_baris):
+        mask = np.zeros(n_baris, dtype=bool)
+        mask[np.frombuffer(self.baris_1, dtype=np.int64)] = True
+        mask[np.frombuffer(self.baris_2, dtype=np.int64)] = True
+        return mask
+
+    def _kolom(self, df, nama_pangkalan_index):
+        baris_1 = np.frombuffer(self.baris_1, dtype=np.int64)
+        baris_2 = np.frombuffer(self.baris_2, dtype=np.int64)
+        nama_pangkalan = df.iloc[:, nama_pangkalan_index].to_numpy()
+        jarak = np.round(np.frombuffer(self.jarak, dtype=np.float32).astype(np.float64), 2)
+        field_jarak = np.frombuffer(self.field_jarak, dtype=np.int16).astype(np.int64)
+        return baris_1, nama_pangkalan[baris_1], nama_pangkalan[baris_2], jarak, field_jarak
+
+    def to_frame(self, df, nama_pangkalan_index, nama_agen_index):
+        baris_1, pangkalan_1, pangkalan_2, jarak, field_jarak = self._kolom(df, nama_pangkalan_index)
+        return pd.DataFrame({
+            'Pangkalan 1': pangkalan_1,
+            'Pangkalan 2': pangkalan_2,
+            'Jarak (m)': jarak,
+            'Nama Agen': df.iloc[:, nama_agen_index].to_numpy()[baris_1],
+            'Field Jarak': field_jarak
+        })
+
+    def to_frame_rekap_2(self, df, nama_pangkalan_index):
+        _, pangkalan_1, pangkalan_2, jarak, field_jarak = self._kolom(df, nama_pangkalan_index)
+        return pd.DataFrame({
+            'Nama Pangkalan 1': pangkalan_1,
+            'Nama Pangkalan 2': pangkalan_2,
+            'Selisih Jarak (m)': jarak,
+            'Field Jarak': field_jarak
+        })
+
+class HasilRegion:
+    __slots__ = ("nama_file", "hasil_df", "pairs", "koordinat_identik", "temuan", "koordinat")
+
+    def __init__(self, nama_file, hasil_df, pairs, koordinat_identik, temuan, koordinat=None):
+        self.nama_file = nama_file
+        self.hasil_df = hasil_df
+        self.pairs = pairs
+        self.koordinat_identik = koordinat_identik
+        self.temuan = temuan
+        # (lat, lon) bersih searah baris hasil_df, dipakai ekspor GIS agar tidak membersihkan ulang
+        self.koordinat = koordinat
+
+def _xyz(lat, lon):
+    phi, lam = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+
+class IndeksPangkalan:
+    __slots__ = ("df", "lat", "lon", "baris", "tree")
+
+    def __init__(self, df, koordinat=None):
+        from scipy.spatial import cKDTree
+
+        lat, lon = koordinat if koordinat is not None else clean_coordinates(df)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        self.df = df
+        self.baris = np.flatnonzero(valid)
+        self.lat = np.asarray(lat)[valid]
+        self.lon = np.asarray(lon)[valid]
+        self.tree = cKDTree(_xyz(self.lat, self.lon))
+
+    def __len__(self):
+        return len(self.baris)
+
+    def info_pangkalan(self, i, jarak):
+        row = self.df.iloc[self.baris[i]]
+        return {
+            "id_pangkalan": int(self.df.index[self.baris[i]]),
+            "sold_id": row.iloc[soldtoparty_index],
+            "nama_agen": row.iloc[nama_agen_index],
+            "nama_pangkalan": row.iloc[nama_pangkalan_index],
+            "latitude": float(self.lat[i]),
+            "longitude": float(self.lon[i]),
+            "jarak_m": float(jarak)
+        }
+
+    def cari_radius(self, lat, lon, radius_m):
+        return self.cari_radius_batch([lat], [lon], radius_m)[0]
+
+    def cari_radius_batch(self, lat, lon, radius_m):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        chord = 2 * np.sin(radius_m / 1000 / 6371.0 / 2) * (1 + 1e-9)
+        hasil = []
+        for k, kandidat in enumerate(self.tree.query_ball_point(_xyz(lat, lon), chord)):
+            kandidat = np.asarray(kandidat, dtype=np.int64)
+            jarak = np.round(haversine_np(lat[k], lon[k], self.lat[kandidat], self.lon[kandidat]) * 1000, 2)
+            urutan = np.argsort(jarak, kind="stable")
+            hasil.append([self.info_pangkalan(i, j) for i, j in zip(kandidat[urutan], jarak[urutan]) if j < radius_m])
+        return hasil
+
+    def terdekat(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        _, idx = self.tree.query(_xyz(lat, lon), k=1)
+        jarak = np.round(haversine_np(lat, lon, self.lat[idx], self.lon[idx]) * 1000, 2)
+        return idx, jarak
+
+def screen_candidates(indeks, kandidat_df, batas_meter):
+    kolom = {str(c).strip().lower(): c for c in kandidat_df.columns}
+    kolom_lat = kolom.get("latitude", kandidat_df.columns[lat_index] if len(kandidat_df.columns) > lat_index else None)
+    kolom_lon = kolom.get("longitude", kandidat_df.columns[lon_index] if len(kandidat_df.columns) > lon_index else None)
+    if kolom_lat is None or kolom_lon is None:
+        raise ValueError("File kandidat harus memiliki kolom Latitude dan Longitude")
+
+    lat, lon, _ = _perbaiki_lat_lon(kandidat_df[kolom_lat], kandidat_df[kolom_lon])
+    # cek provinsi/kota hanya bila file kandidat memakai susunan kolom template pangkalan
+    template = len(kandidat_df.columns) > kota_index and kandidat_df.columns[lat_index] == kolom_lat
+    luar = check_plausibility(kandidat_df if template else kandidat_df[[kolom_lat, kolom_lon]], lat, lon) != ""
+    valid = ~(np.isnan(lat) | np.isnan(lon) | luar)
+
+    hasil = kandidat_df.copy()
+    pangkalan = np.full(len(hasil), None, dtype=object)
+    agen = np.full(len(hasil), None, dtype=object)
+    sold_id = np.full(len(hasil), None, dtype=object)
+    jarak = np.full(len(hasil), np.nan)
+    if valid.any() and len(indeks):
+        idx, jarak_valid = indeks.terdekat(lat[valid], lon[valid])
+        baris = indeks.df.iloc[indeks.baris[idx]]
+        pangkalan[valid] = baris.iloc[:, nama_pangkalan_index].to_numpy()
+        agen[valid] = baris.iloc[:, nama_agen_index].to_numpy()
+        sold_id[valid] = baris.iloc[:, soldtoparty_index].to_numpy()
+        jarak[valid] = jarak_valid
+
+    hasil["Pangkalan Terdekat"] = pangkalan
+    hasil["Nama Agen Terdekat"] = agen
+    hasil["Sold ID Terdekat"] = sold_id
+    hasil["Jarak Terdekat (m)"] = jarak
+    hasil["Status"] = np.where(~valid, "Koordinat tidak valid",
+                               np.where(jarak < batas_meter, f"Di bawah {batas_meter} meter", "Memenuhi"))
+    return hasil
+
+def _dalam_rentang(v, rentang):
+    return (v >= rentang[0]) & (v <= rentang[1])
+
+def _parse_dms(nilai):
+    teks = nilai.astype("string").str.strip().str.upper()
+    # kelompok angka yang hanya dipisah spasi ("3 36 04") juga dibaca sebagai derajat menit detik
+    punya_penanda = teks.str.contains(r"[°º˚'′’\"″”]|[NSEWUTB]$|^[NSEWUTB]|LU|LS|BT|BB|\d\s+\d", regex=True, na=False)
+    bagian = teks.where(punya_penanda).str.extract(DMS_PATTERN)
+    def angka(kolom):
+        return pd.to_numeric(bagian[kolom].str.replace(",", "."), errors="coerce").to_numpy(
+            dtype=np.float64, na_value=np.nan)
+    derajat = angka("deg")
+    menit = np.nan_to_num(angka("min"))
+    detik = np.nan_to_num(angka("sec"))
+    hemisfer = bagian["hemi1"].fillna(bagian["hemi2"])
+    negatif = hemisfer.isin(HEMISFER_NEGATIF).to_numpy(dtype=bool, na_value=False) | (derajat < 0)
+    hasil = np.abs(derajat) + menit / 60 + detik / 3600
+    # derajat pecahan yang masih diikuti menit ("3.6011 11"), atau menit pecahan yang diikuti detik, ditolak
+    pecahan = ((bagian["deg"].str.contains(r"[.,]", na=False) & bagian["min"].notna())
+               | (bagian["min"].str.contains(r"[.,]", na=False) & bagian["sec"].notna())).to_numpy(dtype=bool)
+    valid = ~np.isnan(hasil) & (menit < 60) & (detik < 60) & ~pecahan
+    return np.where(negatif, -hasil, hasil), valid, ~np.isnan(derajat), hemisfer.fillna("").to_numpy(dtype=object)
+
+def _bersihkan_angka(nilai):
+    teks = nilai.astype("string").str.strip().str.replace(",", ".", regex=False)
+    # angka yang terpisah spasi tidak digabung karena hasilnya menjadi titik lain yang tampak wajar
+    teks = teks.where(~teks.str.contains(r"\d\s+\d", regex=True, na=False))
+    teks = teks.str.replace(r'["\']', "", regex=True).str.replace(r"[^0-9.\-]", "", regex=True)
+    return pd.to_numeric(teks, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+def _pulihkan_desimal(v, rentang):
+    # pembagian 10^k terkecil yang membawa nilai ke dalam rentang, NaN bila tidak ada
+    hasil = np.where(_dalam_rentang(v, rentang), v, np.nan)
+    perlu = np.isnan(hasil) & (np.abs(v) >= 100)
+    for k in range(1, 10):
+        kandidat = v / 10**k
+        cocok = perlu & _dalam_rentang(kandidat, rentang)
+        hasil[cocok] = kandidat[cocok]
+        perlu &= ~cocok
+    return hasil
+
+def _perbaiki_lat_lon(seri_lat, seri_lon):
+    kolom = {"Latitude": seri_lat, "Longitude": seri_lon}
+    mentah = {}
+    aturan = {}
+    dms = {nama: _parse_dms(seri) for nama, seri in kolom.items()}
+    # huruf hemisfer harus milik kolomnya sendiri, kecuali kedua kolom sama-sama memakai huruf kolom lain
+    izin = {"Latitude": HEMISFER_LAT, "Longitude": HEMISFER_LON}
+    tertukar = np.isin(dms["Latitude"][3], HEMISFER_LON) & np.isin(dms["Longitude"][3], HEMISFER_LAT)
+    for nama, seri in kolom.items():
+        nilai_dms, valid, cocok, hemisfer = dms[nama]
+        pakai_dms = valid & ((hemisfer == "") | np.isin(hemisfer, izin[nama]) | tertukar)
+        # pola DMS yang cocok tetapi ditolak tidak dibaca ulang sebagai angka biasa
+        mentah[nama] = np.where(pakai_dms, nilai_dms, np.where(cocok, np.nan, _bersihkan_angka(seri)))
+        aturan[nama] = np.where(pakai_dms, "Format DMS", "")
+
+    # titik desimal dipulihkan ke rentang kolomnya sendiri; rentang kolom lain hanya dipakai bila
+    # kedua kolom sama-sama cocok sebagai pasangan Latitude/Longitude yang tertukar
+    v_lat, v_lon = mentah["Latitude"], mentah["Longitude"]
+    lat_sendiri, lon_sendiri = _pulihkan_desimal(v_lat, LAT_INDONESIA), _pulihkan_desimal(v_lon, LON_INDONESIA)
+    lat_tukar, lon_tukar = _pulihkan_desimal(v_lat, LON_INDONESIA), _pulihkan_desimal(v_lon, LAT_INDONESIA)
+    normal = ~np.isnan(lat_sendiri) & ~np.isnan(lon_sendiri)
+    pakai_tukar = ~normal & ~np.isnan(lat_tukar) & ~np.isnan(lon_tukar)
+    nilai = {
+        "Latitude": np.where(pakai_tukar, lat_tukar, np.where(np.isnan(lat_sendiri), v_lat, lat_sendiri)),
+        "Longitude": np.where(pakai_tukar, lon_tukar, np.where(np.isnan(lon_sendiri), v_lon, lon_sendiri)),
+    }
+    for nama in kolom:
+        desimal = (nilai[nama] != mentah[nama]) & ~np.isnan(mentah[nama]) & (aturan[nama] == "")
+        aturan[nama] = np.where(desimal, "Titik desimal", aturan[nama])
+
+    lat, lon = nilai["Latitude"], nilai["Longitude"]
+    tertukar = (_dalam_rentang(lat, LON_INDONESIA) & _dalam_rentang(lon, LAT_INDONESIA)
+                & ~_dalam_rentang(lat, LAT_INDONESIA))
+    lat, lon = np.where(tertukar, lon, lat), np.where(tertukar, lat, lon)
+    for nama in kolom:
+        aturan[nama] = np.where(tertukar, np.char.add(aturan[nama], np.where(aturan[nama] == "", "Tertukar", ", Tertukar")),
+                                aturan[nama])
+    return lat, lon, aturan
+
+def repair_coordinates(df):
+    kolom = {"Latitude": df.iloc[:, lat_index], "Longitude": df.iloc[:, lon_index]}
+    lat, lon, aturan = _perbaiki_lat_lon(kolom["Latitude"], kolom["Longitude"])
+    laporan = []
+    for nama, baru in (("Latitude", lat), ("Longitude", lon)):
+        berubah = np.flatnonzero(aturan[nama] != "")
+        laporan.append(pd.DataFrame({
+            "Baris": df.index.to_numpy()[berubah] + 2,
+            "Nama Pangkalan": df.iloc[berubah, nama_pangkalan_index].to_numpy(),
+            "Kolom": nama,
+            "Nilai Awal": kolom[nama].iloc[berubah].astype(str).to_numpy(),
+            "Nilai Baru": baru[berubah],
+            "Aturan": aturan[nama][berubah]
+        }))
+    laporan = pd.concat(laporan, ignore_index=True).sort_values(["Baris", "Kolom"], kind="stable", ignore_index=True)
+    return lat, lon, laporan
+
+_tabel_wilayah = {}
+
+def _normalisasi_wilayah(seri):
+    teks = seri.astype("string").str.upper().str.replace(r"[.\s]+", " ", regex=True).str.strip()
+    teks = teks.str.replace(r"^(PROVINSI|PROV) ", "", regex=True).str.replace(r"^KAB ", "KABUPATEN ", regex=True)
+    return teks.replace(ALIAS_WILAYAH).fillna("")
+
+def muat_tabel_wilayah(path=None):
+    path = path or WILAYAH_PATH
+    if path not in _tabel_wilayah:
+        with open(path, "rb") as f:
+            data = f.read()
+        tabel = pd.read_csv(io.BytesIO(data), dtype={"Nama Provinsi": str, "Nama Kota / Kabupaten": str})
+        tabel["Nama Provinsi"] = _normalisasi_wilayah(tabel["Nama Provinsi"])
+        tabel["Nama Kota / Kabupaten"] = _normalisasi_wilayah(tabel["Nama Kota / Kabupaten"])
+        tabel.attrs["digest"] = hashlib.sha256(data).hexdigest()
+        _tabel_wilayah[path] = tabel
+    return _tabel_wilayah[path]
+
+def _di_luar_bbox(lat, lon, bbox):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    t = TOLERANSI_WILAYAH
+    return (lat < lat_min - t) | (lat > lat_max + t) | (lon < lon_min - t) | (lon > lon_max + t)
+
+def check_plausibility(df, lat, lon, path=None):
+    alasan = np.full(len(df), "", dtype=object)
+    ada = ~(np.isnan(lat) | np.isnan(lon))
+    kolom_bbox = ["Lat Min", "Lat Max", "Lon Min", "Lon Max"]
+
+    if len(df.columns) > kota_index:
+        tabel = muat_tabel_wilayah(path)
+        provinsi = _normalisasi_wilayah(df.iloc[:, provinsi_index])
+        kota = _normalisasi_wilayah(df.iloc[:, kota_index])
+        per_kota = tabel[tabel["Tingkat"] != "Provinsi"].set_index(["Nama Provinsi", "Nama Kota / Kabupaten"])
+        per_provinsi = tabel[tabel["Tingkat"] == "Provinsi"].set_index("Nama Provinsi")
+
+        bbox = per_kota[kolom_bbox].reindex(pd.MultiIndex.from_arrays([provinsi, kota])).to_numpy().T
+        luar = ada & _di_luar_bbox(lat, lon, bbox)
+        alasan[luar] = ("Di luar wilayah " + df.iloc[:, kota_index].astype(str)).to_numpy()[luar]
+
+        bbox = per_provinsi[kolom_bbox].reindex(provinsi).to_numpy().T
+        luar = ada & _di_luar_bbox(lat, lon, bbox)
+        alasan[luar] = ("Di luar wilayah provinsi " + df.iloc[:, provinsi_index].astype(str)).to_numpy()[luar]
+
+    luar = ada & _di_luar_bbox(lat, lon, (*LAT_INDONESIA, *LON_INDONESIA))
+    alasan[luar] = "Di luar wilayah Indonesia"
+    return alasan
+
+def find_implausible_coordinates(df):
+    lat, lon, _ = repair_coordinates(df)
+    alasan = check_plausibility(df, lat, lon)
+    luar = np.flatnonzero(alasan != "")
+    return pd.DataFrame({
+        "Nama Pangkalan": df.iloc[luar, nama_pangkalan_index].to_numpy(),
+        "Nama Agen": df.iloc[luar, soldtoparty_index].to_numpy(),
+        "Baris": df.index.to_numpy()[luar] + 2,
+        "Latitude": lat[luar],
+        "Longitude": lon[luar],
+        "Alasan": alasan[luar]
+    }).to_dict("records")
+
+def clean_coordinates(df):
+    # titik di luar wilayah dijadikan NaN agar tidak ikut dihitung jaraknya
+    lat, lon, _ = repair_coordinates(df)
+    luar = check_plausibility(df, lat, lon) != ""
+    lat[luar] = np.nan
+    lon[luar] = np.nan
+    return lat, lon
+
+class CacheKoordinat:
+    __slots__ = ("direktori", "budget_bytes")
+
+    VERSI = "v5"
+    KOLOM = ("lat", "lon", "id")
+
+    def __init__(self, direktori=None, budget_mb=None):
+        self.direktori = direktori or os.environ.get(
+            "CEK_KOORDINAT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cek_koordinat_cache"))
+        self.budget_bytes = int(float(budget_mb or os.environ.get("CEK_KOORDINAT_CACHE_MB", 512)) * 1024 * 1024)
+        os.makedirs(self.direktori, exist_ok=True)
+
+    def kunci(self, data, encoding):
+        h = hashlib.sha256(data)
+        h.update(f"|{encoding}|{self.VERSI}|{muat_tabel_wilayah().attrs['digest']}".encode())
+        return h.hexdigest()
+
+    def path(self, kunci):
+        return os.path.join(self.direktori, kunci)
+
+    def ambil_atau_buat(self, data, encoding, df):
+        kunci = self.kunci(data, encoding)
+        path = self.path(kunci)
+        if os.path.isdir(path):
+            os.utime(path)
+            return path
+
+        lat, lon = clean_coordinates(df)
+        sementara = tempfile.mkdtemp(prefix=f".{kunci}.", dir=self.direktori)
+        np.save(os.path.join(sementara, "lat.npy"), lat)
+        np.save(os.path.join(sementara, "lon.npy"), lon)
+        np.save(os.path.join(sementara, "id.npy"), df.index.to_numpy(dtype=np.int64))
+        try:
+            os.rename(sementara, path)
+        except OSError:
+            # sesi lain sudah menulis entri yang sama lebih dulu
+            shutil.rmtree(sementara, ignore_errors=True)
+        self.evict(kecuali=kunci)
+        return path
+
+    def evict(self, kecuali=None):
+        def ukuran_entri(path):
+            return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+        entri = []
+        total = 0
+        for nama in os.listdir(self.direktori):
+            path = self.path(nama)
+            if nama.startswith(".") or not os.path.isdir(path):
+                continue
+            ukuran = ukuran_entri(path)
+            total += ukuran
+            if nama != kecuali:
+                entri.append((os.path.getmtime(path), ukuran, path))
+        for _, ukuran, path in sorted(entri):
+            if total <= self.budget_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= ukuran
+
+def load_koordinat(path):
+    return tuple(np.load(os.path.join(path, f"{kolom}.npy"), mmap_mode="r") for kolom in CacheKoordinat.KOLOM)
+
+def _nama_unik(kandidat, terpakai):
+    # nama file dipakai sebagai kunci region, jadi nama kembar (mis. dua data.csv di folder ZIP berbeda) dibedakan
+    for nama in kandidat:
+        if nama not in terpakai:
+            break
+    else:
+        dasar, ekstensi = os.path.splitext(kandidat[0])
+        nomor = 2
+        while f"{dasar} ({nomor}){ekstensi}" in terpakai:
+            nomor += 1
+        nama = f"{dasar} ({nomor}){ekstensi}"
+    terpakai.add(nama)
+    return nama
+
+def _buka_entri_zip(data, nama_entri):
+    return ZipFile(io.BytesIO(data)).open(nama_entri)
+
+def expand_uploads(files, terpakai=None, stream=False):
+    # stream=True: entri ZIP dikembalikan sebagai fungsi pembuka agar tidak didekompresi seluruhnya ke memori
+    terpakai = set() if terpakai is None else terpakai
+    hasil = []
+    for nama, data in files:
+        if nama.lower().endswith(".zip"):
+            with ZipFile(io.BytesIO(data)) as zip_file:
+                for info in zip_file.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(".csv"):
+                        kandidat = (info.filename.rsplit("/", 1)[-1], info.filename.replace("/", "_"))
+                        isi = (lambda data=data, nama_entri=info.filename: _buka_entri_zip(data, nama_entri)) \
+                            if stream else zip_file.read(info)
+                        hasil.append((_nama_unik(kandidat, terpakai), isi))
+        else:
+            hasil.append((_nama_unik((nama,), terpakai), data))
+    return hasil
+
+def read_upload(data, encoding):
+    df = pd.read_csv(io.BytesIO(data), encoding=encoding)
+    df.index = pd.RangeIndex(len(df), name="id_pangkalan")
+    return df
+
+def find_invalid_coordinates(df):
+    invalid_rows = []
+    _, _, laporan = repair_coordinates(df)
+    aturan_per_baris = laporan.groupby("Baris")["Aturan"].agg(lambda a: ", ".join(sorted(set(", ".join(a).split(", ")))))
+    for idx, row in df.iterrows():
+        lat = row.iloc[lat_index]
+        lon = row.iloc[lon_index]
+        valid_lat, reason_lat = is_valid_coordinate(lat)
+        valid_lon, reason_lon = is_valid_coordinate(lon)
+        if not valid_lat or not valid_lon:
+            reason = reason_lat if not valid_lat else reason_lon
+            invalid_rows.append({
+                "Nama Pangkalan": row.iloc[nama_pangkalan_index],
+                "Nama Agen": row.iloc[soldtoparty_index],
+                "Baris": idx + 2,
+                "Alasan": reason
+            })
+        elif idx + 2 in aturan_per_baris.index:
+            invalid_rows.append({
+                "Nama Pangkalan": row.iloc[nama_pangkalan_index],
+                "Nama Agen": row.iloc[soldtoparty_index],
+                "Baris": idx + 2,
+                "Alasan": f"Koordinat perlu perbaikan ({aturan_per_baris[idx + 2]})"
+            })
+    return invalid_rows
+
+def fix_coordinates(df):
+    lat, lon, laporan = repair_coordinates(df)
+    berhasil = ~(np.isnan(lat) | np.isnan(lon))
+    df[df.columns[lat_index]] = np.where(berhasil, lat, df.iloc[:, lat_index].to_numpy(dtype=object))
+    df[df.columns[lon_index]] = np.where(berhasil, lon, df.iloc[:, lon_index].to_numpy(dtype=object))
+    gagal = np.flatnonzero(~berhasil)
+    gagal_diperbaiki = [
+        (df.index[i] + 2, df.iloc[i, nama_pangkalan_index], df.iloc[i, soldtoparty_index]) for i in gagal
+    ]
+    return gagal_diperbaiki, laporan
+
+METADATA_SURAT_DEFAULT = {
+    "tempat": "Medan",
+    "tanggal": "{bulan} {tahun}",
+    "nomor": "No. /PND430000/{tahun}-S3",
+    "region": "Sumbagut",
+    "jabatan": "Region Manager Retail Sales {region}",
+    "penandatangan": "Edith Indra Triyadi",
+}
+NAMA_BULAN = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli", "Agustus", "September", "Oktober",
+              "November", "Desember"]
+
+_profil_surat = {}
+_template_surat = None
+
+def _baca_profil(path):
+    kunci = (path, os.path.getmtime(path))
+    if kunci not in _profil_surat:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                profil = json.load(f)
+            else:
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError(f"PyYAML belum terpasang, profil {path} tidak dapat dibaca")
+                profil = yaml.safe_load(f) or {}
+        if not isinstance(profil, dict):
+            raise ValueError(f"Profil surat {path} harus berisi pasangan kunci dan nilai")
+        _profil_surat[kunci] = {k: str(v) for k, v in profil.items() if k in METADATA_SURAT_DEFAULT}
+    return _profil_surat[kunci]
+
+def letter_profile(nama_file, direktori=None):
+    direktori = direktori or PROFIL_SURAT_DIR
+    region = os.path.splitext(os.path.basename(nama_file))[0].lower()
+    metadata = dict(METADATA_SURAT_DEFAULT)
+    for nama in ("default", region):
+        for ekstensi in (".json", ".yaml", ".yml"):
+            path = os.path.join(direktori, nama + ekstensi)
+            if os.path.isfile(path):
+                metadata.update(_baca_profil(path))
+                break
+    return metadata
+
+def letter_metadata(nama_file, isian=None, tanggal=None, direktori=None):
+    metadata = letter_profile(nama_file, direktori)
+    metadata.update({k: v for k, v in (isian or {}).items() if v})
+    tanggal = tanggal or datetime.date.today()
+    nilai = {"bulan": NAMA_BULAN[tanggal.month - 1], "tahun": str(tanggal.year)}
+    nilai["region"] = _isi_placeholder(metadata["region"], nilai)
+    return {k: _isi_placeholder(v, nilai) for k, v in metadata.items()}
+
+def _isi_placeholder(teks, nilai):
+    # hanya {bulan}, {tahun} dan {region} yang diganti; kurung kurawal lain (mis. pada nomor surat) dibiarkan
+    teks = str(teks)
+    for kunci, isi in nilai.items():
+        teks = teks.replace("{" + kunci + "}", isi)
+    return teks
+
+def _dokumen_surat():
+    global _template_surat
+    from docx import Document
+    from docx.shared import Pt
+
+    if _template_surat is None:
+        doc = Document()
+        style = doc.styles['Normal']
+        font = style.font
+        font.name = 'Arial'
+        font.size = Pt(12)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        _template_surat = buffer.getvalue()
+    return Document(io.BytesIO(_template_surat))
+
+def _tulis_surat(doc, nama_agen, batas_meter, identik, klaster, metadata):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    def add_paragraph_justify(text):
+        p = doc.add_paragraph(text)
+        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        p.paragraph_format.space_after = Pt(0)
+
+    doc.add_paragraph(f"{metadata['tempat']}, {metadata['tanggal']}").alignment = WD_ALIGN_PARAGRAPH.LEFT
+    doc.add_paragraph(metadata["nomor"]).alignment = WD_ALIGN_PARAGRAPH.LEFT
+    doc.add_paragraph("Lampiran:")
+
+    perihal_paragraph = doc.add_paragraph()
+    formatted_agen = format_agent_name(nama_agen)
+    run_perihal = perihal_paragraph.add_run(f"Perihal: Evaluasi Data Pangkalan {formatted_agen} pada SIMELON")
+    run_perihal.bold = True
+    perihal_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    doc.add_paragraph("Yang terhormat")
+    doc.add_paragraph(f"Pimpinan {formatted_agen}")
+    doc.add_paragraph("Di Tempat")
+
+    add_paragraph_justify("\nDengan hormat,")
+    add_paragraph_justify("\nDalam rangka menjamin kemudahan akses masyarakat untuk mendapatkan LPG 3 Kg...")
+    if identik:
+        add_paragraph_justify(
+            "\nHasil evaluasi tersebut ditemukan bahwa terdapat pangkalan dengan Koordinat Identik (titik lokasi sama) yaitu:")
+        for nomor, (pangkalan_list_sorted, lat, lon) in enumerate(identik, start=1):
+            teks = f"{nomor}. Pangkalan " + ", Pangkalan ".join(pangkalan_list_sorted) + f" ({lat}, {lon})"
+            add_paragraph_justify(teks)
+
+    if klaster:
+        if identik:
+            add_paragraph_justify(
+                f"\nSelain itu, terdapat pangkalan dengan titik lokasi dibawah {batas_meter} meter yaitu:")
+        else:
+            add_paragraph_justify(
+                f"\nHasil evaluasi tersebut ditemukan bahwa terdapat pangkalan dengan titik lokasi dibawah {batas_meter} meter yaitu:")
+        for nomor, pangkalan_list_sorted in enumerate(klaster, start=1):
+            teks = f"{nomor}. Pangkalan " + ", Pangkalan ".join(pangkalan_list_sorted)
+            add_paragraph_justify(teks)
+
+    add_paragraph_justify("\nSehubungan dengan hal tersebut, maka kami minta Saudara melakukan evaluasi berupa:")
+    add_paragraph_justify(
+        "1. Memastikan kembali titik lokasi pangkalan sesuai dengan kondisi riil lapangan dan mengupdate pada Web SIMELON.")
+    add_paragraph_justify(
+        "2. Apabila pangkalan benar pada titik lokasi yang sama, maka segera lakukan pemindahan lokasi salah satu pangkalan.")
+    add_paragraph_justify(
+        "\nSelanjutnya agar Saudara segera menindaklanjuti temuan tersebut dan melaporkan kembali kepada kami dalam waktu 1 bulan kedepan.")
+
+    add_paragraph_justify("\nDemikian disampaikan, atas perhatian dan kerjasamanya kami ucapkan terima kasih.")
+    doc.add_paragraph(f"\n{metadata['jabatan']}")
+    doc.add_paragraph(metadata["penandatangan"])
+
+def build_letter(nama_agen, batas_meter, identik, klaster, metadata=None):
+    doc = _dokumen_surat()
+    _tulis_surat(doc, nama_agen, batas_meter, identik, klaster, metadata or letter_metadata(""))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer.read()
+
+def build_consolidated_letter(temuan, batas_meter, metadata):
+    doc = _dokumen_surat()
+    judul = doc.add_paragraph()
+    judul.add_run(f"Rekap Evaluasi Data Pangkalan Region {metadata['region']}").bold = True
+    doc.add_paragraph(f"{metadata['tempat']}, {metadata['tanggal']} - batas jarak {batas_meter} meter")
+
+    tabel = doc.add_table(rows=1, cols=5)
+    tabel.style = "Table Grid"
+    for sel, teks in zip(tabel.rows[0].cells, ("No", "Nama Agen", "Lokasi Koordinat Identik",
+                                                f"Klaster di bawah {batas_meter} m", "Pangkalan Terlibat")):
+        sel.text = teks
+    for nomor, (nama_agen, identik, klaster) in enumerate(temuan, start=1):
+        terlibat = len({n for nama, _, _ in identik for n in nama} | {n for nama in klaster for n in nama})
+        for sel, teks in zip(tabel.add_row().cells, (nomor, format_agent_name(nama_agen), len(identik), len(klaster),
+                                                     terlibat)):
+            sel.text = str(teks)
+    doc.add_paragraph(f"\nJumlah agen dengan temuan: {len(temuan)}")
+
+    for nama_agen, identik, klaster in temuan:
+        doc.add_page_break()
+        _tulis_surat(doc, nama_agen, batas_meter, identik, klaster, metadata)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer.read()
+
+def build_letters(temuan, batas_meter, metadata):
+    return [
+        (f"Evaluasi Data Pangkalan {nama_agen}.docx", build_letter(nama_agen, batas_meter, identik, klaster, metadata))
+        for nama_agen, identik, klaster in temuan
+    ]
+
+def process_region(nama_file, df, batas_meter, slider_max, urut_spasial=False, koordinat_path=None):
+    if koordinat_path is not None:
+        lat_all, lon_all, _ = load_koordinat(koordinat_path)
+    else:
+        lat_all, lon_all = clean_coordinates(df)
+    grouped = df.groupby(df.columns[soldtoparty_index])
+    all_group_dfs = []
+    lat_hasil = []
+    lon_hasil = []
+    rekap_distance_pairs = PairStore()
+    koordinat_identik = []
+    temuan = []
+    offset = 0
+
+    for soldtoparty, group in grouped:
+        id_group = group.index.to_numpy()
+        nama_agen = group.iloc[0, nama_agen_index]
+        koordinat = list(zip(lat_all[id_group].tolist(), lon_all[id_group].tolist()))
+        n = len(koordinat)
+        if urut_spasial and n > 2:
+            urutan = hilbert_order(koordinat)
+            group = group.iloc[urutan].copy()
+            id_group = group.index.to_numpy()
+            koordinat = [koordinat[i] for i in urutan]
+        identik_group, kode_identik = find_identical_coordinates(koordinat)
+        for rows in identik_group:
+            lat, lon = koordinat[rows[0]]
+            koordinat_identik.append((nama_agen, lat, lon, [offset + i for i in rows]))
+
+        lat_group, lon_group = np.array(koordinat, dtype=np.float64).reshape(-1, 2).T
+        # koordinat hasil perbaikan ditulis ke tabel hasil; titik luar wilayah/tak terbaca tetap nilai aslinya
+        for index, nilai in ((lat_index, lat_group), (lon_index, lon_group)):
+            group.isetitem(index, np.where(np.isnan(nilai), group.iloc[:, index].to_numpy(), nilai))
+        buffer, (pair_awal, pair_akhir, pair_jarak, pair_d) = hitung_jarak_window(
+            lat_group, lon_group, kode_identik, slider_max, batas_meter)
+        for d in range(1, slider_max + 1):
+            jarak_list = buffer[d - 1].astype(object)
+            jarak_list[:d] = ""
+            group[f'Jarak {d} (m)'] = jarak_list
+
+        all_group_dfs.append(group)
+        lat_hasil.append(lat_group)
+        lon_hasil.append(lon_group)
+
+        awal_pasangan = len(rekap_distance_pairs)
+        nama_pangkalan_group = group.iloc[:, nama_pangkalan_index]
+        rekap_distance_pairs.add_many(offset + pair_awal, offset + pair_akhir, pair_jarak, pair_d)
+        ada_pasangan = len(rekap_distance_pairs) > awal_pasangan
+
+        if ada_pasangan or identik_group:
+            identik = []
+            for rows in identik_group:
+                lat, lon = koordinat[rows[0]]
+                identik.append((sorted(nama_pangkalan_group.iloc[rows], key=lambda x: x.lower()), lat, lon))
+
+            klaster = []
+            if ada_pasangan:
+                import networkx as nx
+
+                G = nx.Graph()
+                for baris_1, baris_2 in rekap_distance_pairs.rows(awal_pasangan):
+                    G.add_edge(id_group[baris_1 - offset], id_group[baris_2 - offset])
+
+                for comp in nx.connected_components(G):
+                    klaster.append(sorted(nama_pangkalan_group[list(comp)], key=lambda x: x.lower()))
+
+            temuan.append((nama_agen, identik, klaster))
+
+        offset += n
+
+    return HasilRegion(nama_file, pd.concat(all_group_dfs), rekap_distance_pairs, koordinat_identik, temuan,
+                       (np.concatenate(lat_hasil), np.concatenate(lon_hasil)))
+
+def merge_results(hasil_list):
+    if len(hasil_list) == 1:
+        return hasil_list[0]
+    all_dfs = []
+    rekap_distance_pairs = PairStore()
+    koordinat_identik = []
+    offset = 0
+    for hasil in hasil_list:
+        all_dfs.append(hasil.hasil_df.assign(**{"Nama File": hasil.nama_file}))
+        rekap_distance_pairs.extend(hasil.pairs, offset)
+        for nama_agen, lat, lon, rows in hasil.koordinat_identik:
+            koordinat_identik.append((nama_agen, lat, lon, [offset + i for i in rows]))
+        offset += len(hasil.hasil_df)
+    koordinat = None
+    if all(hasil.koordinat is not None for hasil in hasil_list):
+        koordinat = tuple(np.concatenate([hasil.koordinat[i] for hasil in hasil_list]) for i in range(2))
+    return HasilRegion("gabungan", pd.concat(all_dfs), rekap_distance_pairs, koordinat_identik,
+                       [t for hasil in hasil_list for t in hasil.temuan], koordinat)
+
+def build_workbook(hasil, batas_meter):
+    df_final = hasil.hasil_df
+    rekap_distance_pairs = hasil.pairs
+    koordinat_identik = hasil.koordinat_identik
+    excel_buffer = io.BytesIO()
+
+    if rekap_distance_pairs or koordinat_identik:
+        df_rekap_pair = rekap_distance_pairs.to_frame(df_final, nama_pangkalan_index, nama_agen_index)
+        pangkalan_terlibat = rekap_distance_pairs.mask_terlibat(len(df_final))
+        nama_pangkalan_final = df_final.iloc[:, nama_pangkalan_index].to_numpy()
+        list_identik = []
+        for nama_agen, lat, lon, rows in koordinat_identik:
+            pangkalan_terlibat[rows] = True
+            list_identik.append({
+                'Nama Agen': nama_agen,
+                'Latitude': lat,
+                'Longitude': lon,
+                'Jumlah Pangkalan': len(rows),
+                'Nama Pangkalan': ", ".join(nama_pangkalan_final[rows])
+            })
+        df_identik = pd.DataFrame(list_identik, columns=['Nama Agen', 'Latitude', 'Longitude',
+                                                         'Jumlah Pangkalan', 'Nama Pangkalan'])
+
+        summary_text = f"\nRekapitulasi:\nJumlah pasangan pangkalan dengan jarak di bawah {batas_meter} meter: {len(df_rekap_pair)}\nJumlah lokasi dengan Koordinat Identik: {len(df_identik)}\nJumlah pangkalan unik yang terlibat: {int(pangkalan_terlibat.sum())}\n"
+
+        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+            df_final.to_excel(writer, index=False, sheet_name='Hasil Validasi')
+            df_rekap_pair.to_excel(writer, index=False, sheet_name='Rekap Pasangan Pangkalan')
+
+            df_rekap_2 = rekap_distance_pairs.to_frame_rekap_2(df_final, nama_pangkalan_index)
+            df_rekap_2.to_excel(writer, index=False, sheet_name='rekap-2')
+            df_identik.to_excel(writer, index=False, sheet_name='Koordinat Identik')
+
+            workbook = writer.book
+            worksheet_main = writer.sheets['Hasil Validasi']
+            worksheet_rekap = writer.sheets['Rekap Pasangan Pangkalan']
+
+            format_highlight = workbook.add_format({'font_color': 'red', 'bg_color': '#FFFF00'})
+            format_pangkalan = workbook.add_format({'font_color': 'blue', 'bold': True})
+
+            jarak_cols = [col for col in df_final.columns if col.startswith("Jarak ")]
+            for col_index, col_name in enumerate(df_final.columns):
+                if col_name in jarak_cols:
+                    for row_idx, value in enumerate(df_final[col_name]):
+                        if isinstance(value, (int, float)) and value < batas_meter:
+                            worksheet_main.write(row_idx + 1, col_index, value, format_highlight)
+
+            for row_idx in np.flatnonzero(pangkalan_terlibat):
+                pangkalan_name = df_final.iloc[row_idx, nama_pangkalan_index]
+                worksheet_main.write(row_idx + 1, nama_pangkalan_index, pangkalan_name, format_pangkalan)
+
+            last_row = len(df_rekap_pair) + 2
+            worksheet_rekap.write(last_row, 0, summary_text)
+
+        excel_buffer.seek(0)
+        return "hasil_jarak_format_dan_rekap.xlsx", excel_buffer
+
+    with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+        df_final.to_excel(writer, index=False, sheet_name='Hasil Validasi')
+        workbook = writer.book
+        worksheet = writer.sheets['Hasil Validasi']
+        format_highlight = workbook.add_format({'font_color': 'red', 'bg_color': '#FFFF00'})
+        jarak_cols = [col for col in df_final.columns if col.startswith("Jarak ")]
+        for col_index, col_name in enumerate(df_final.columns):
+            if col_name in jarak_cols:
+                for row_idx, value in enumerate(df_final[col_name]):
+                    if isinstance(value, (int, float)) and value < batas_meter:
+                        worksheet.write(row_idx + 1, col_index, value, format_highlight)
+
+    excel_buffer.seek(0)
+    return "hasil_jarak_format.xlsx", excel_buffer
+
+UKURAN_CHUNK_GIS = 100_000
+UKURAN_CHUNK_BACA = 200_000
+# memori puncak mode hemat memori kira-kira WORKER_SHARD x BARIS_PER_SHARD baris hasil di memori sekaligus
+BARIS_PER_SHARD = int(os.environ.get("CEK_KOORDINAT_BARIS_PER_SHARD", 50_000))
+WORKER_SHARD = int(os.environ.get("CEK_KOORDINAT_WORKER_SHARD", 2))
+UKURAN_CONTOH = 1000
+
+class RingkasanUpload:
+    __slots__ = ("jumlah_baris", "jumlah_per_sold_id", "sold_id_teks", "tipe_kolom", "contoh", "invalid",
+                 "luar_wilayah", "gagal_diperbaiki", "laporan_perbaikan")
+
+    def __init__(self):
+        self.jumlah_baris = 0
+        self.jumlah_per_sold_id = pd.Series(dtype=np.int64)
+        self.sold_id_teks = pd.Series(dtype=object)
+        self.tipe_kolom = {}
+        self.contoh = None
+        self.invalid = []
+        self.luar_wilayah = []
+        self.gagal_diperbaiki = []
+        self.laporan_perbaikan = None
+
+    @property
+    def kelompok_terbesar(self):
+        return int(self.jumlah_per_sold_id.max()) if len(self.jumlah_per_sold_id) else 0
+
+class HasilShard:
+    __slots__ = ("path_hasil", "jumlah_baris", "pairs", "koordinat_identik", "temuan")
+
+    def __init__(self, path_hasil, jumlah_baris, pairs, koordinat_identik, temuan):
+        self.path_hasil = path_hasil
+        self.jumlah_baris = jumlah_baris
+        self.pairs = pairs
+        self.koordinat_identik = koordinat_identik
+        self.temuan = temuan
+
+class HasilSharded:
+    __slots__ = ("nama_file", "shards", "temuan", "direktori")
+
+    def __init__(self, nama_file, shards, direktori=None):
+        self.nama_file = nama_file
+        self.shards = shards
+        self.direktori = direktori
+        self.temuan = [t for shard in shards for t in shard.temuan]
+
+    def __len__(self):
+        return sum(shard.jumlah_baris for shard in self.shards)
+
+def _gabung_tipe(tipe, kind):
+    # meniru tipe kolom hasil read_csv sekaligus dari tipe tiap chunk
+    if tipe is None or tipe == kind:
+        return kind
+    if "O" in (tipe, kind) or "b" in (tipe, kind):
+        return "O"
+    return "f"
+
+def _baca_bertahap(sumber, encoding, **kwargs):
+    # sumber berupa bytes, path, atau fungsi yang membuka stream baru (mis. entri ZIP)
+    f = io.BytesIO(sumber) if isinstance(sumber, bytes) else (sumber() if callable(sumber) else open(sumber, "rb"))
+    with f:
+        for chunk in pd.read_csv(f, encoding=encoding, chunksize=UKURAN_CHUNK_BACA, **kwargs):
+            chunk.index.name = "id_pangkalan"
+            yield chunk
+
+def _sold_id_bertipe(teks_unik, ada_kosong=False):
+    # tipe Sold ID ditentukan dari teks uniknya dengan inferensi read_csv yang sama seperti membaca file sekaligus
+    teks_unik = pd.Series(teks_unik, dtype=object)
+    if not len(teks_unik):
+        return "f", teks_unik
+    bertipe = pd.read_csv(io.StringIO(teks_unik.to_csv(index=False, header=False)), header=None).iloc[:, 0]
+    if ada_kosong and bertipe.dtype.kind == "i":
+        # Sold ID kosong membuat read_csv membaca kolom bilangan bulat sebagai float
+        bertipe = bertipe.astype(np.float64)
+    return bertipe.dtype.kind, pd.Series(bertipe.to_numpy(), index=teks_unik.to_numpy())
+
+def scan_upload(sumber, encoding, periksa=True):
+    ringkasan = RingkasanUpload()
+    jumlah = None
+    ada_kosong = False
+    contoh = []
+    laporan = []
+    # Sold ID dibaca sebagai teks agar kunci shard sama persis di semua chunk
+    for chunk in _baca_bertahap(sumber, encoding, dtype={soldtoparty_index: str}):
+        ringkasan.jumlah_baris += len(chunk)
+        hitung = chunk.iloc[:, soldtoparty_index].value_counts()
+        ada_kosong = ada_kosong or hitung.sum() < len(chunk)
+        jumlah = hitung if jumlah is None else jumlah.add(hitung, fill_value=0)
+        for kolom, dtype in chunk.dtypes.items():
+            ringkasan.tipe_kolom[kolom] = _gabung_tipe(ringkasan.tipe_kolom.get(kolom), dtype.kind)
+        if not periksa:
+            continue
+        # indeks chunk melanjutkan nomor baris file sehingga kolom "Baris" tetap sesuai file asli
+        if sum(len(c) for c in contoh) < UKURAN_CONTOH:
+            contoh.append(chunk.head(UKURAN_CONTOH - sum(len(c) for c in contoh)).copy())
+        ringkasan.invalid.extend(find_invalid_coordinates(chunk))
+        ringkasan.luar_wilayah.extend(find_implausible_coordinates(chunk))
+        gagal, laporan_chunk = fix_coordinates(chunk)
+        ringkasan.gagal_diperbaiki.extend(gagal)
+        laporan.append(laporan_chunk)
+
+    jumlah = pd.Series(dtype=np.int64) if jumlah is None else jumlah.astype(np.int64)
+    kind, ringkasan.sold_id_teks = _sold_id_bertipe(jumlah.index, ada_kosong)
+    if ringkasan.tipe_kolom:
+        ringkasan.tipe_kolom[list(ringkasan.tipe_kolom)[soldtoparty_index]] = kind
+    ringkasan.jumlah_per_sold_id = jumlah.groupby(ringkasan.sold_id_teks.reindex(jumlah.index).to_numpy()).sum()
+    if periksa:
+        peta = ringkasan.sold_id_teks.to_dict()
+        for baris in ringkasan.invalid + ringkasan.luar_wilayah:
+            baris["Nama Agen"] = peta.get(baris["Nama Agen"], baris["Nama Agen"])
+        ringkasan.gagal_diperbaiki = [(b, pangkalan, peta.get(agen, agen))
+                                      for b, pangkalan, agen in ringkasan.gagal_diperbaiki]
+        ringkasan.contoh = pd.concat(contoh) if contoh else pd.DataFrame()
+        if len(ringkasan.contoh.columns):
+            ringkasan.contoh[ringkasan.contoh.columns[soldtoparty_index]] = \
+                ringkasan.contoh.iloc[:, soldtoparty_index].map(peta)
+        ringkasan.laporan_perbaikan = pd.concat(laporan, ignore_index=True) if laporan else pd.DataFrame()
+    return ringkasan
+
+def partition_by_sold_id(sumber, encoding, direktori, baris_per_shard=None, ringkasan=None):
+    baris_per_shard = baris_per_shard or BARIS_PER_SHARD
+    if ringkasan is None:
+        ringkasan = scan_upload(sumber, encoding, periksa=False)
+    jumlah = ringkasan.jumlah_per_sold_id
+    if not len(jumlah):
+        return [], {}
+    dtype = {kolom: {"i": "int64", "f": "float64", "b": "bool"}.get(kind, "str")
+             for kolom, kind in ringkasan.tipe_kolom.items()}
+
+    # Sold ID diurutkan seperti groupby lalu dibagi menjadi rentang berurutan agar urutan keluaran tetap sama
+    nomor_shard = np.zeros(len(jumlah), dtype=np.int64)
+    isi = 0
+    for i, n in enumerate(jumlah.to_numpy()):
+        nomor_shard[i] = nomor_shard[i - 1] if i else 0
+        if isi and isi + n > baris_per_shard:
+            nomor_shard[i] += 1
+            isi = 0
+        isi += n
+    shard_per_teks = ringkasan.sold_id_teks.map(pd.Series(nomor_shard, index=jumlah.index))
+    paths = [os.path.join(direktori, f"shard_{nomor:05d}.csv") for nomor in range(nomor_shard[-1] + 1)]
+
+    for chunk in _baca_bertahap(sumber, encoding, dtype=str):
+        tujuan = chunk.iloc[:, soldtoparty_index].map(shard_per_teks)
+        for nomor, bagian in chunk.groupby(tujuan.to_numpy()):
+            path = paths[int(nomor)]
+            bagian.to_csv(path, mode="a", header=not os.path.exists(path), encoding="utf-8")
+    return paths, dtype
+
+def process_shard(path, nama_file, batas_meter, slider_max, urut_spasial=False, dtype=None):
+    df = pd.read_csv(path, encoding="utf-8", dtype=dtype, index_col=0)
+    id_global = df.index.to_numpy()
+    df.index = pd.RangeIndex(len(df), name="id_pangkalan")
+    hasil = process_region(nama_file, df, batas_meter, slider_max, urut_spasial)
+    hasil.hasil_df.index = pd.Index(id_global[hasil.hasil_df.index.to_numpy()], name="id_pangkalan")
+    path_hasil = os.path.splitext(path)[0] + "_hasil.pkl"
+    hasil.hasil_df.to_pickle(path_hasil)
+    return HasilShard(path_hasil, len(hasil.hasil_df), hasil.pairs, hasil.koordinat_identik, hasil.temuan)
+
+def process_sharded(nama_file, sumber, encoding, batas_meter, slider_max, urut_spasial=False, direktori=None,
+                    baris_per_shard=None, executor=None, progres=None, ringkasan=None):
+    direktori = tempfile.mkdtemp(prefix="shard_", dir=direktori)
+    try:
+        paths, dtype = partition_by_sold_id(sumber, encoding, direktori, baris_per_shard, ringkasan)
+        argumen = (nama_file, batas_meter, slider_max, urut_spasial, dtype)
+        if executor is None:
+            hasil_shard = (process_shard(path, *argumen) for path in paths)
+        else:
+            futures = [executor.submit(process_shard, path, *argumen) for path in paths]
+            hasil_shard = (future.result() for future in futures)
+
+        shards = []
+        for selesai, shard in enumerate(hasil_shard, start=1):
+            shards.append(shard)
+            os.remove(paths[selesai - 1])
+            if progres is not None:
+                progres(selesai, len(paths))
+    except BaseException:
+        shutil.rmtree(direktori, ignore_errors=True)
+        raise
+    return HasilSharded(nama_file, shards, direktori)
+
+def load_sharded_result(hasil):
+    all_dfs = []
+    rekap_distance_pairs = PairStore()
+    koordinat_identik = []
+    offset = 0
+    for shard in hasil.shards:
+        all_dfs.append(pd.read_pickle(shard.path_hasil))
+        rekap_distance_pairs.extend(shard.pairs, offset)
+        for nama_agen, lat, lon, rows in shard.koordinat_identik:
+            koordinat_identik.append((nama_agen, lat, lon, [offset + i for i in rows]))
+        offset += shard.jumlah_baris
+    hasil_df = pd.concat(all_dfs) if all_dfs else pd.DataFrame()
+    return HasilRegion(hasil.nama_file, hasil_df, rekap_distance_pairs, koordinat_identik, hasil.temuan)
+
+def remove_sharded_result(hasil):
+    if hasil.direktori is not None:
+        shutil.rmtree(hasil.direktori, ignore_errors=True)
+
+def _tulis_sel(worksheet, baris, kolom, nilai, format_sel=None):
+    if nilai is None or (isinstance(nilai, float) and math.isnan(nilai)) or (isinstance(nilai, str) and not nilai):
+        if format_sel is not None:
+            worksheet.write_blank(baris, kolom, None, format_sel)
+        return
+    if isinstance(nilai, np.generic):
+        nilai = nilai.item()
+    worksheet.write(baris, kolom, nilai, format_sel)
+
+def _tulis_frame(worksheet, baris_awal, df, format_sel=None):
+    for baris, nilai_baris in enumerate(df.itertuples(index=False), start=baris_awal):
+        for kolom, nilai in enumerate(nilai_baris):
+            _tulis_sel(worksheet, baris, kolom, nilai, None if format_sel is None else format_sel(baris, kolom, nilai))
+    return baris_awal + len(df)
+
+def build_workbook_sharded(hasil_list, batas_meter):
+    import xlsxwriter
+
+    multi_file = len(hasil_list) > 1
+    jumlah_pasangan = sum(len(shard.pairs) for hasil in hasil_list for shard in hasil.shards)
+    jumlah_identik = sum(len(shard.koordinat_identik) for hasil in hasil_list for shard in hasil.shards)
+    ada_temuan = bool(jumlah_pasangan or jumlah_identik)
+
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    format_header = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    format_highlight = workbook.add_format({'font_color': 'red', 'bg_color': '#FFFF00'})
+    format_pangkalan = workbook.add_format({'font_color': 'blue', 'bold': True})
+
+    def tulis_header(worksheet, kolom):
+        for nomor, nama in enumerate(kolom):
+            worksheet.write(0, nomor, nama, format_header)
+
+    worksheet_main = workbook.add_worksheet('Hasil Validasi')
+    baris = {"main": 1, "rekap": 1, "rekap_2": 1, "identik": 1}
+    if ada_temuan:
+        worksheet_rekap = workbook.add_worksheet('Rekap Pasangan Pangkalan')
+        worksheet_rekap_2 = workbook.add_worksheet('rekap-2')
+        worksheet_identik = workbook.add_worksheet('Koordinat Identik')
+        tulis_header(worksheet_rekap, ['Pangkalan 1', 'Pangkalan 2', 'Jarak (m)', 'Nama Agen', 'Field Jarak'])
+        tulis_header(worksheet_rekap_2, ['Nama Pangkalan 1', 'Nama Pangkalan 2', 'Selisih Jarak (m)', 'Field Jarak'])
+        tulis_header(worksheet_identik, ['Nama Agen', 'Latitude', 'Longitude', 'Jumlah Pangkalan', 'Nama Pangkalan'])
+
+    header_ditulis = False
+    jumlah_terlibat = 0
+    for hasil in hasil_list:
+        for shard in hasil.shards:
+            # hanya satu shard yang dimuat ke memori pada satu waktu
+            df = pd.read_pickle(shard.path_hasil)
+            if multi_file:
+                df["Nama File"] = hasil.nama_file
+            if not header_ditulis:
+                tulis_header(worksheet_main, df.columns)
+                header_ditulis = True
+
+            terlibat = shard.pairs.mask_terlibat(len(df))
+            for _, _, _, rows in shard.koordinat_identik:
+                terlibat[rows] = True
+            jumlah_terlibat += int(terlibat.sum())
+            kolom_jarak = {nomor for nomor, nama in enumerate(df.columns) if str(nama).startswith("Jarak ")}
+            awal = baris["main"]
+
+            def format_main(baris_sel, kolom, nilai):
+                if kolom in kolom_jarak and isinstance(nilai, (int, float)) and nilai < batas_meter:
+                    return format_highlight
+                if kolom == nama_pangkalan_index and ada_temuan and terlibat[baris_sel - awal]:
+                    return format_pangkalan
+                return None
+
+            baris["main"] = _tulis_frame(worksheet_main, awal, df, format_main)
+            if not ada_temuan:
+                continue
+
+            baris["rekap"] = _tulis_frame(worksheet_rekap, baris["rekap"],
+                                          shard.pairs.to_frame(df, nama_pangkalan_index, nama_agen_index))
+            baris["rekap_2"] = _tulis_frame(worksheet_rekap_2, baris["rekap_2"],
+                                            shard.pairs.to_frame_rekap_2(df, nama_pangkalan_index))
+            nama_pangkalan = df.iloc[:, nama_pangkalan_index].to_numpy()
+            df_identik = pd.DataFrame(
+                [(nama_agen, lat, lon, len(rows), ", ".join(nama_pangkalan[rows]))
+                 for nama_agen, lat, lon, rows in shard.koordinat_identik],
+                columns=['Nama Agen', 'Latitude', 'Longitude', 'Jumlah Pangkalan', 'Nama Pangkalan'])
+            baris["identik"] = _tulis_frame(worksheet_identik, baris["identik"], df_identik)
+
+    if ada_temuan:
+        summary_text = f"\nRekapitulasi:\nJumlah pasangan pangkalan dengan jarak di bawah {batas_meter} meter: {jumlah_pasangan}\nJumlah lokasi dengan Koordinat Identik: {jumlah_identik}\nJumlah pangkalan unik yang terlibat: {jumlah_terlibat}\n"
+        worksheet_rekap.write(jumlah_pasangan + 2, 0, summary_text)
+    workbook.close()
+    buffer.seek(0)
+    return ("hasil_jarak_format_dan_rekap.xlsx" if ada_temuan else "hasil_jarak_format.xlsx"), buffer
+
+def cluster_ids(hasil):
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n = len(hasil.hasil_df)
+    awal = [np.frombuffer(hasil.pairs.baris_1, dtype=np.int64)]
+    akhir = [np.frombuffer(hasil.pairs.baris_2, dtype=np.int64)]
+    melanggar = hasil.pairs.mask_terlibat(n)
+    for _, _, _, rows in hasil.koordinat_identik:
+        awal.append(np.full(len(rows) - 1, rows[0], dtype=np.int64))
+        akhir.append(np.asarray(rows[1:], dtype=np.int64))
+        melanggar[rows] = True
+    awal, akhir = np.concatenate(awal), np.concatenate(akhir)
+    graf = coo_matrix((np.ones(len(awal), dtype=np.int8), (awal, akhir)), shape=(n, n))
+    _, label = connected_components(graf, directed=False)
+    klaster = np.zeros(n, dtype=np.int64)
+    klaster[melanggar] = np.unique(label[melanggar], return_inverse=True)[1] + 1
+    return klaster, melanggar
+
+def _atribut_titik(hasil, klaster, melanggar):
+    df = hasil.hasil_df
+    atribut = {
+        "Sold ID": df.iloc[:, soldtoparty_index].to_numpy(),
+        "Nama Agen": df.iloc[:, nama_agen_index].to_numpy(),
+        "Nama Pangkalan": df.iloc[:, nama_pangkalan_index].to_numpy(),
+    }
+    if "Nama File" in df.columns:
+        atribut["Nama File"] = df["Nama File"].to_numpy()
+    atribut["Klaster"] = klaster
+    atribut["Melanggar"] = melanggar
+    return pd.DataFrame(atribut)
+
+def _atribut_pasangan(hasil, klaster):
+    atribut = hasil.pairs.to_frame(hasil.hasil_df, nama_pangkalan_index, nama_agen_index)
+    atribut["Klaster"] = klaster[np.frombuffer(hasil.pairs.baris_1, dtype=np.int64)]
+    return atribut
+
+def _potongan(n):
+    for awal in range(0, n, UKURAN_CHUNK_GIS):
+        yield slice(awal, min(awal + UKURAN_CHUNK_GIS, n))
+
+def _json_default(obj):
+    return obj.item() if hasattr(obj, "item") else str(obj)
+
+def _properti(atribut):
+    atribut = atribut.astype(object)
+    return atribut.where(atribut.notna(), None).to_dict("records")
+
+def _koordinat_hasil(hasil):
+    if hasil.koordinat is not None:
+        return hasil.koordinat
+    return clean_coordinates(hasil.hasil_df)
+
+def write_geojson(hasil, f):
+    lat, lon = _koordinat_hasil(hasil)
+    klaster, melanggar = cluster_ids(hasil)
+    baris_1 = np.frombuffer(hasil.pairs.baris_1, dtype=np.int64)
+    baris_2 = np.frombuffer(hasil.pairs.baris_2, dtype=np.int64)
+    atribut_titik = _atribut_titik(hasil, klaster, melanggar)
+    atribut_pasangan = _atribut_pasangan(hasil, klaster)
+
+    ada_fitur = False
+
+    def tulis_fitur(fitur):
+        nonlocal ada_fitur
+        teks = ",\n".join(json.dumps(fitur_, ensure_ascii=False, default=_json_default) for fitur_ in fitur)
+        if teks:
+            f.write(((",\n" if ada_fitur else "") + teks).encode("utf-8"))
+            ada_fitur = True
+
+    f.write(b'{"type": "FeatureCollection", "features": [\n')
+    for potong in _potongan(len(atribut_titik)):
+        tulis_fitur(
+            {"type": "Feature",
+             "geometry": None if la != la or lo != lo else {"type": "Point", "coordinates": [lo, la]},
+             "properties": properti}
+            for la, lo, properti in zip(lat[potong].tolist(), lon[potong].tolist(),
+                                        _properti(atribut_titik.iloc[potong]))
+        )
+    for potong in _potongan(len(atribut_pasangan)):
+        b1, b2 = baris_1[potong], baris_2[potong]
+        tulis_fitur(
+            {"type": "Feature",
+             "geometry": {"type": "LineString", "coordinates": [[lo1, la1], [lo2, la2]]},
+             "properties": properti}
+            for la1, lo1, la2, lo2, properti in zip(lat[b1].tolist(), lon[b1].tolist(), lat[b2].tolist(),
+                                                    lon[b2].tolist(), _properti(atribut_pasangan.iloc[potong]))
+        )
+    f.write(b"\n]}\n")
+
+def _wkb(xy, jenis):
+    import pyarrow as pa
+
+    # WKB little-endian: 1 = Point, 2 = LineString dengan 2 titik
+    if jenis == 1:
+        dtype = np.dtype([("urutan", "u1"), ("jenis", "<u4"), ("xy", "<f8", (2,))])
+    else:
+        dtype = np.dtype([("urutan", "u1"), ("jenis", "<u4"), ("jumlah", "<u4"), ("xy", "<f8", (4,))])
+    rekaman = np.zeros(len(xy), dtype=dtype)
+    rekaman["urutan"] = 1
+    rekaman["jenis"] = jenis
+    if jenis == 2:
+        rekaman["jumlah"] = 2
+    rekaman["xy"] = xy
+    valid = ~np.isnan(xy).any(axis=1)
+    offset = np.arange(len(xy) + 1, dtype=np.int32) * dtype.itemsize
+    return pa.Array.from_buffers(
+        pa.binary(), len(xy),
+        [pa.py_buffer(np.packbits(valid, bitorder="little")), pa.py_buffer(offset), pa.py_buffer(rekaman.tobytes())],
+        null_count=int((~valid).sum()))
+
+def _tulis_geoparquet(path, atribut, xy, jenis):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for kolom in atribut.columns[atribut.dtypes == object]:
+        atribut[kolom] = atribut[kolom].astype("string")
+    skema = pa.Schema.from_pandas(atribut, preserve_index=False).append(pa.field("geometry", pa.binary()))
+    geo = {"version": "1.0.0", "primary_column": "geometry",
+           "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point" if jenis == 1 else "LineString"]}}}
+    skema = skema.with_metadata({**(skema.metadata or {}), b"geo": json.dumps(geo).encode()})
+    with pq.ParquetWriter(path, skema, compression="zstd") as writer:
+        for potong in _potongan(len(atribut)):
+            tabel = pa.Table.from_pandas(atribut.iloc[potong], schema=skema.remove(len(skema) - 1),
+                                         preserve_index=False)
+            writer.write_table(tabel.append_column(skema.field("geometry"), _wkb(xy[potong], jenis)))
+
+def write_geoparquet(hasil, path_titik, path_pasangan):
+    lat, lon = _koordinat_hasil(hasil)
+    klaster, melanggar = cluster_ids(hasil)
+    baris_1 = np.frombuffer(hasil.pairs.baris_1, dtype=np.int64)
+    baris_2 = np.frombuffer(hasil.pairs.baris_2, dtype=np.int64)
+    _tulis_geoparquet(path_titik, _atribut_titik(hasil, klaster, melanggar), np.column_stack([lon, lat]), 1)
+    _tulis_geoparquet(path_pasangan, _atribut_pasangan(hasil, klaster),
+                      np.column_stack([lon[baris_1], lat[baris_1], lon[baris_2], lat[baris_2]]), 2)
+
+# ekspor ditulis bertahap ke file sementara; isi file baru dibaca ke memori saat diunduh
+def build_geojson(hasil):
+    with tempfile.TemporaryFile() as f:
+        write_geojson(hasil, f)
+        f.seek(0)
+        return f.read()
+
+def build_geoparquet(hasil):
+    with tempfile.TemporaryDirectory() as direktori:
+        path_titik = os.path.join(direktori, "titik_pangkalan.parquet")
+        path_pasangan = os.path.join(direktori, "pasangan_pangkalan.parquet")
+        path_zip = os.path.join(direktori, "geoparquet.zip")
+        write_geoparquet(hasil, path_titik, path_pasangan)
+        with ZipFile(path_zip, "w") as zip_file:
+            zip_file.write(path_titik, "titik_pangkalan.parquet")
+            zip_file.write(path_pasangan, "pasangan_pangkalan.parquet")
+        with open(path_zip, "rb") as f:
+            return f.read()
+
+def build_letter_archive(word_files):
+    zip_buffer = io.BytesIO()
+    with ZipFile(zip_buffer, "w") as zip_file:
+        for filename, data in word_files:
+            zip_file.writestr(filename, data)
+    zip_buffer.seek(0)
+    return zip_buffer
@@ -1,66 +1,154 @@
 import streamlit as st
 import pandas as pd
-import math
+import numpy as np
 import io
-from docx import Document
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.shared import Pt
-from zipfile import ZipFile
-import re
-import networkx as nx
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-def is_valid_coordinate(coord):
-    if pd.isna(coord):
-        return False, "Nilai kosong"
-    if isinstance(coord, str):
-        coord = coord.strip().replace(",", ".").replace('"', "").replace("'", "").upper()
-        if coord in ("", "NULL", "NA", "N/A", "NONE", "-"):
-            return False, "Nilai kosong atau tidak valid"
-        if re.search(r"[^0-9.\-]", coord):
-            return False, "Mengandung karakter tidak valid (spasi/tanda baca)"
-        try:
-            float(coord)
-            return True, ""
-        except:
-            return False, "Format angka tidak valid"
-    try:
-        float(coord)
-        return True, ""
-    except:
-        return False, "Format angka tidak valid"
-
-def clean_coordinate(coord):
-    try:
-        if pd.isna(coord):
-            return None
-        if isinstance(coord, str):
-            coord = coord.strip().replace(",", ".").replace('"', "").replace("'", "").upper()
-            if coord in ("", "NULL", "NA", "N/A", "NONE", "-"):
-                return None
-            coord = re.sub(r"[^0-9.\-]", "", coord)
-        return float(coord)
-    except:
-        return None
-
-def format_agent_name(name):
-    if name.startswith("PT. "):
-        after_pt = name[4:].strip()
-        words = after_pt.split()
-        formatted_words = [word.capitalize() for word in words]
-        return "PT. " + " ".join(formatted_words)
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cek_koordinat_engine import (
+    soldtoparty_index, kecamatan_index, WORKER_SHARD, PYARROW_TERSEDIA,
+    expand_uploads, read_upload, find_invalid_coordinates, find_implausible_coordinates, fix_coordinates,
+    process_region, merge_results, build_workbook, build_geojson, build_geoparquet, scan_upload, process_sharded,
+    build_workbook_sharded, remove_sharded_result, build_letter_archive, IndeksPangkalan,
+    screen_candidates, CacheKoordinat, load_koordinat, letter_metadata, build_letters,
+    build_consolidated_letter
+)
+
+UKURAN_HALAMAN = [50, 100, 500, 1000]
+FORMAT_SURAT = ["ZIP (satu file per agen)", "Satu dokumen gabungan (DOCX)"]
+LABEL_METADATA_SURAT = {
+    "tempat": "Tempat surat",
+    "tanggal": "Tanggal surat",
+    "nomor": "Nomor surat",
+    "region": "Region",
+    "jabatan": "Jabatan penandatangan",
+    "penandatangan": "Nama penandatangan",
+}
+
+def ringkasan_kolom(df):
+    ringkasan = pd.DataFrame({
+        "Kolom": df.columns.astype(str),
+        "Tipe": df.dtypes.astype(str).to_numpy(),
+        "Terisi": df.notna().sum().to_numpy(),
+        "Kosong": df.isna().sum().to_numpy(),
+        "Unik": df.nunique().to_numpy(),
+    })
+    numerik = df.select_dtypes("number")
+    ringkasan["Min"] = ringkasan["Kolom"].map(numerik.min().rename(str))
+    ringkasan["Max"] = ringkasan["Kolom"].map(numerik.max().rename(str))
+    return ringkasan
+
+def tampilkan_tabel(df, key, sidik, filter_kolom=()):
+    # sidik = identitas sumber tabel (file_id unggahan, encoding, dll.) sehingga ringkasan hanya dihitung ulang
+    # saat sumbernya berganti, tanpa meng-hash seluruh isi tabel di setiap rerun
+    kunci_ringkasan = f"ringkasan_{key}"
+    if st.session_state.get(kunci_ringkasan, (None,))[0] != sidik:
+        st.session_state[kunci_ringkasan] = (sidik, ringkasan_kolom(df))
+    with st.expander(f"Ringkasan kolom ({len(df)} baris)"):
+        st.dataframe(st.session_state[kunci_ringkasan][1])
+
+    kolom_filter = [kolom for kolom in filter_kolom if kolom in df.columns]
+    if kolom_filter:
+        filter_cols = st.columns(len(kolom_filter))
+        for kolom, col in zip(kolom_filter, filter_cols):
+            with col:
+                pilihan = st.multiselect(f"Filter {kolom}", sorted(df[kolom].dropna().unique().tolist()),
+                                         key=f"filter_{key}_{kolom}")
+            if pilihan:
+                df = df[df[kolom].isin(pilihan)]
+
+    col_ukuran, col_halaman = st.columns(2)
+    with col_ukuran:
+        ukuran = st.selectbox("Baris per halaman", UKURAN_HALAMAN, index=1, key=f"ukuran_{key}")
+    jumlah_halaman = max(1, -(-len(df) // ukuran))
+    with col_halaman:
+        halaman = st.number_input(f"Halaman (1-{jumlah_halaman})", min_value=1, max_value=jumlah_halaman,
+                                  value=1, step=1, key=f"halaman_{key}")
+    awal = (min(int(halaman), jumlah_halaman) - 1) * ukuran
+    st.dataframe(df.iloc[awal:awal + ukuran])
+    st.caption(f"Menampilkan baris {awal + 1 if len(df) else 0}-{min(awal + ukuran, len(df))} dari {len(df)}")
+
+def tampilkan_perbaikan(sidik, ada_region=True):
+    laporan_perbaikan, gagal_perbaikan = st.session_state["perbaikan"]
+    for judul, gagal_diperbaiki in gagal_perbaikan:
+        st.error(judul)
+        for baris, pangkalan, agen in gagal_diperbaiki:
+            st.write(f"- Baris ke-{baris}, Pangkalan: {pangkalan}, Agen: {agen}")
+
+    if len(laporan_perbaikan):
+        st.info(f"{len(laporan_perbaikan)} nilai koordinat diperbaiki otomatis "
+                "(format DMS, titik desimal, atau Latitude/Longitude tertukar):")
+        tampilkan_tabel(laporan_perbaikan, "laporan_perbaikan", sidik, filter_kolom=("File", "Aturan"))
+        excel_laporan = io.BytesIO()
+        laporan_perbaikan.to_excel(excel_laporan, index=False, sheet_name="Laporan Perbaikan")
+        excel_laporan.seek(0)
+        st.download_button(
+            "Unduh Laporan Perbaikan Koordinat (Excel)",
+            data=excel_laporan,
+            file_name="laporan_perbaikan_koordinat.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+    if not ada_region:
+        st.warning("Silakan perbaiki koordinat secara manual dan unggah ulang file CSV-nya.")
+    elif gagal_perbaikan:
+        st.warning("File yang gagal diperbaiki tidak ikut diproses. Silakan perbaiki koordinat secara "
+                   "manual dan unggah ulang file CSV tersebut.")
     else:
-        words = name.split()
-        formatted_words = [word.capitalize() for word in words]
-        return " ".join(formatted_words)
+        st.success("Semua koordinat berhasil diperbaiki secara otomatis.")
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def baca_dan_periksa(data, encoding):
+    # disimpan per isi file agar rerun (form surat, filter, halaman tabel) tidak membaca dan memeriksa ulang
+    df = read_upload(data, encoding)
+    return df, find_invalid_coordinates(df), find_implausible_coordinates(df)
+
+@st.fragment
+def tampilkan_surat():
+    temuan_region = st.session_state.get("temuan") or {}
+    if not temuan_region:
+        return
+
+    with st.form("metadata_surat_form"):
+        st.write("Metadata surat (kosongkan untuk mengikuti profil region):")
+        profil = letter_metadata(next(iter(temuan_region)))
+        kolom_form = st.columns(2)
+        isian = {}
+        for nomor, (kunci, label) in enumerate(LABEL_METADATA_SURAT.items()):
+            with kolom_form[nomor % 2]:
+                isian[kunci] = st.text_input(label, placeholder=profil[kunci], key=f"surat_{kunci}").strip()
+        format_surat = st.radio("Format surat:", FORMAT_SURAT, index=0, key="format_surat", horizontal=True)
+        st.form_submit_button("TERAPKAN METADATA SURAT")
+    gabungan = format_surat == FORMAT_SURAT[1]
+
+    # surat dibuat ulang dari temuan yang tersimpan, jarak tidak dihitung ulang
+    arsip_surat = st.session_state.setdefault("arsip_surat", {})
+    for nama_file, temuan in temuan_region.items():
+        metadata = letter_metadata(nama_file, isian)
+        kunci_arsip = (nama_file, gabungan, tuple(sorted(metadata.items())))
+        if kunci_arsip not in arsip_surat:
+            if gabungan:
+                arsip_surat[kunci_arsip] = build_consolidated_letter(
+                    temuan, st.session_state["batas_meter_surat"], metadata)
+            else:
+                word_files = build_letters(temuan, st.session_state["batas_meter_surat"], metadata)
+                arsip_surat[kunci_arsip] = build_letter_archive(word_files).getvalue()
+
+        region = os.path.splitext(nama_file)[0]
+        if gabungan:
+            label, filename = f"Unduh Rekap Agen {region} (DOCX gabungan)", f"rekap_agen_{region}.docx"
+            mime = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        elif len(temuan_region) == 1:
+            label, filename, mime = "Unduh Semua Rekap Agen (ZIP)", "rekap_agen.zip", "application/zip"
+        else:
+            label, filename, mime = f"Unduh Rekap Agen {region} (ZIP)", f"rekap_agen_{region}.zip", "application/zip"
+        st.download_button(
+            label,
+            data=arsip_surat[kunci_arsip],
+            file_name=filename,
+            mime=mime,
+            key=f"zip_{nama_file}"
+        )
 
 st.title("Evaluasi Jarak Koordinat Pangkalan LPG 3 Kg")
 
@@ -77,7 +165,11 @@ st.markdown(
 
 encoding_option = st.selectbox("Pilih encoding file CSV (default utf-8):",
                                ["utf-8", "latin1", "utf-16", "cp1252", "ISO-8859-1"], index=0)
-uploaded_file = st.file_uploader("Unggah file CSV format", type=["csv"])
+mode_hemat_memori = st.checkbox(
+    "Mode hemat memori: baca dan proses bertahap per kelompok Sold ID (shard) untuk data skala nasional",
+    value=False)
+uploaded_files = st.file_uploader("Unggah file CSV format (boleh lebih dari satu region, atau ZIP berisi CSV)",
+                                  type=["csv", "zip"], accept_multiple_files=True)
 
 if "last_uploaded_filename" not in st.session_state:
     st.session_state["last_uploaded_filename"] = None
@@ -85,52 +177,94 @@ if "koordinat_bersih" not in st.session_state:
     st.session_state["koordinat_bersih"] = False
 if "hasil_df" not in st.session_state:
     st.session_state["hasil_df"] = None
-if "word_files" not in st.session_state:
-    st.session_state["word_files"] = []
+if "temuan" not in st.session_state:
+    st.session_state["temuan"] = {}
 if "invalid_coord_df" not in st.session_state:
     st.session_state["invalid_coord_df"] = None
+if "file_dikecualikan" not in st.session_state:
+    st.session_state["file_dikecualikan"] = set()
 
-if uploaded_file is not None:
-    if uploaded_file.name != st.session_state["last_uploaded_filename"]:
+if uploaded_files:
+    uploaded_names = tuple(f.name for f in uploaded_files)
+    if uploaded_names != st.session_state["last_uploaded_filename"]:
         for key in list(st.session_state.keys()):
             if key not in ("last_uploaded_filename", "koordinat_bersih", "hasil_df",
-                           "word_files", "invalid_coord_df"):
+                           "temuan", "invalid_coord_df", "file_dikecualikan"):
                 del st.session_state[key]
         st.session_state["koordinat_bersih"] = False
         st.session_state["hasil_df"] = None
-        st.session_state["word_files"] = []
+        st.session_state["temuan"] = {}
         st.session_state["invalid_coord_df"] = None
-        st.session_state["last_uploaded_filename"] = uploaded_file.name
-
-    try:
-        df = pd.read_csv(uploaded_file, encoding=encoding_option)
-    except Exception as e:
-        st.error(f"Gagal membaca file CSV dengan encoding '{encoding_option}': {e}")
+        st.session_state["file_dikecualikan"] = set()
+        st.session_state["last_uploaded_filename"] = uploaded_names
+
+    cache_koordinat = CacheKoordinat()
+    data_region = {}
+    invalid_region = {}
+    luar_wilayah_region = {}
+    koordinat_path = {}
+    # mode hemat memori: file dibaca bertahap, hanya ringkasan (jumlah per Sold ID, contoh, hasil cek) yang disimpan
+    ringkasan_region = {}
+    sumber_region = {}
+    sidik_region = {}
+    daftar_upload = []
+    nama_terpakai = set()
+    for f in uploaded_files:
+        try:
+            daftar_upload.extend((f.file_id, nama_file, data) for nama_file, data in expand_uploads(
+                [(f.name, f.getvalue())], nama_terpakai, stream=mode_hemat_memori))
+        except Exception as e:
+            st.error(f"Gagal membuka file {f.name}: {e}")
+    for file_id, nama_file, data in daftar_upload:
+        if nama_file in st.session_state["file_dikecualikan"]:
+            continue
+        sidik_region[nama_file] = (file_id, nama_file, encoding_option, mode_hemat_memori)
+        if mode_hemat_memori:
+            ringkasan_upload = st.session_state.setdefault("ringkasan_upload", {})
+            kunci = (file_id, nama_file, encoding_option)
+            try:
+                if kunci not in ringkasan_upload:
+                    ringkasan_upload[kunci] = scan_upload(data, encoding_option)
+            except Exception as e:
+                st.error(f"Gagal membaca file CSV {nama_file} dengan encoding '{encoding_option}': {e}")
+                continue
+            ringkasan_region[nama_file] = ringkasan_upload[kunci]
+            sumber_region[nama_file] = data
+            invalid_region[nama_file] = ringkasan_region[nama_file].invalid
+            luar_wilayah_region[nama_file] = ringkasan_region[nama_file].luar_wilayah
+            continue
+        try:
+            data_region[nama_file], invalid_region[nama_file], luar_wilayah_region[nama_file] = baca_dan_periksa(
+                data, encoding_option)
+        except Exception as e:
+            st.error(f"Gagal membaca file CSV {nama_file} dengan encoding '{encoding_option}': {e}")
+            continue
+        koordinat_path[nama_file] = cache_koordinat.ambil_atau_buat(data, encoding_option, data_region[nama_file])
+    nama_region = list(ringkasan_region if mode_hemat_memori else data_region)
+    if not nama_region:
+        if "perbaikan" in st.session_state:
+            tampilkan_perbaikan((), ada_region=False)
         st.stop()
-
-    st.write("Data Awal:")
-    st.dataframe(df)
-
-    lat_index = 8
-    lon_index = 9
-    soldtoparty_index = 0
-    nama_agen_index = 1
-    nama_pangkalan_index = 2
+    multi_region = len(nama_region) > 1
+    sidik_upload = tuple(sidik_region[nama_file] for nama_file in nama_region)
+
+    for nama_file in nama_region:
+        st.write(f"Data Awal ({nama_file}):" if multi_region else "Data Awal:")
+        if mode_hemat_memori:
+            df = ringkasan_region[nama_file].contoh
+            st.caption(f"Mode hemat memori: pratinjau {len(df)} baris pertama dari "
+                       f"{ringkasan_region[nama_file].jumlah_baris} baris.")
+        else:
+            df = data_region[nama_file]
+        tampilkan_tabel(df, f"data_awal_{nama_file}", sidik_region[nama_file],
+                        filter_kolom=(df.columns[soldtoparty_index], df.columns[kecamatan_index]))
 
     invalid_rows = []
-    for idx, row in df.iterrows():
-        lat = row[lat_index]
-        lon = row[lon_index]
-        valid_lat, reason_lat = is_valid_coordinate(lat)
-        valid_lon, reason_lon = is_valid_coordinate(lon)
-        if not valid_lat or not valid_lon:
-            reason = reason_lat if not valid_lat else reason_lon
-            invalid_rows.append({
-                "Nama Pangkalan": row[nama_pangkalan_index],
-                "Nama Agen": row[soldtoparty_index],
-                "Baris": idx + 2,
-                "Alasan": reason
-            })
+    for nama_file in nama_region:
+        for row in invalid_region[nama_file]:
+            if multi_region:
+                row = {"File": nama_file, **row}
+            invalid_rows.append(row)
 
     if not st.session_state["koordinat_bersih"]:
         if invalid_rows:
@@ -138,7 +272,7 @@ if uploaded_file is not None:
             st.warning(f"Terdapat koordinat yang tidak valid sejumlah {jumlah_invalid} baris:")
 
             invalid_df = pd.DataFrame(invalid_rows)
-            st.dataframe(invalid_df)
+            tampilkan_tabel(invalid_df, "koordinat_tidak_valid", sidik_upload, filter_kolom=("File", "Nama Agen"))
             st.session_state["invalid_coord_df"] = invalid_df
 
             excel_invalid = io.BytesIO()
@@ -152,27 +286,34 @@ if uploaded_file is not None:
             )
 
             if st.button("PERBAIKI OTOMATIS"):
-                gagal_diperbaiki = []
-                for i, row in df.iterrows():
-                    lat = clean_coordinate(row[lat_index])
-                    lon = clean_coordinate(row[lon_index])
-                    if lat is not None and lon is not None:
-                        df.at[i, df.columns[lat_index]] = lat
-                        df.at[i, df.columns[lon_index]] = lon
+                # laporan disimpan di session_state agar tetap tampil setelah rerun
+                laporan_perbaikan = []
+                gagal_perbaikan = []
+                for nama_file in list(nama_region):
+                    if mode_hemat_memori:
+                        gagal_diperbaiki = ringkasan_region[nama_file].gagal_diperbaiki
+                        laporan = ringkasan_region[nama_file].laporan_perbaikan.copy()
                     else:
-                        gagal_diperbaiki.append((i + 2, row[nama_pangkalan_index], row[soldtoparty_index]))
-
-                if gagal_diperbaiki:
-                    st.error("Beberapa data tidak dapat diperbaiki secara otomatis:")
-                    for baris, pangkalan, agen in gagal_diperbaiki:
-                        st.write(f"- Baris ke-{baris}, Pangkalan: {pangkalan}, Agen: {agen}")
-                    st.warning("Silakan perbaiki koordinat secara manual dan unggah ulang file CSV-nya.")
+                        gagal_diperbaiki, laporan = fix_coordinates(data_region[nama_file])
+                    if multi_region:
+                        laporan.insert(0, "File", nama_file)
+                    laporan_perbaikan.append(laporan)
+                    if gagal_diperbaiki:
+                        gagal_perbaikan.append((
+                            f"Beberapa data tidak dapat diperbaiki secara otomatis ({nama_file}):"
+                            if multi_region else "Beberapa data tidak dapat diperbaiki secara otomatis:",
+                            gagal_diperbaiki))
+                        st.session_state["file_dikecualikan"].add(nama_file)
+                        nama_region.remove(nama_file)
+                        data_region.pop(nama_file, None)
+
+                st.session_state["perbaikan"] = (pd.concat(laporan_perbaikan, ignore_index=True), gagal_perbaikan)
+                if not nama_region:
+                    tampilkan_perbaikan((), ada_region=False)
                     st.stop()
-                else:
-                    st.success("Semua koordinat berhasil diperbaiki secara otomatis.")
-                    st.session_state["koordinat_bersih"] = True
-                    st.success(
-                        "Silakan tentukan jarak minimal pangkalan dan jumlah jarak kemudian tekan tombol 'PROSES VALIDASI' untuk melanjutkan.")
+                st.session_state["koordinat_bersih"] = True
+                st.success(
+                    "Silakan tentukan jarak minimal pangkalan dan jumlah jarak kemudian tekan tombol 'PROSES VALIDASI' untuk melanjutkan.")
             else:
                 st.stop()
         else:
@@ -180,258 +321,186 @@ if uploaded_file is not None:
             st.session_state["koordinat_bersih"] = True
 
     if st.session_state["koordinat_bersih"]:
+        if "perbaikan" in st.session_state:
+            tampilkan_perbaikan(sidik_upload)
+        luar_wilayah = []
+        for nama_file in nama_region:
+            for row in luar_wilayah_region[nama_file]:
+                if multi_region:
+                    row = {"File": nama_file, **row}
+                luar_wilayah.append(row)
+        if luar_wilayah:
+            st.warning(f"Terdapat {len(luar_wilayah)} pangkalan dengan koordinat di luar wilayah Indonesia/provinsi/"
+                       "kota yang tercantum. Pangkalan tersebut tidak ikut dihitung jaraknya:")
+            luar_wilayah_df = pd.DataFrame(luar_wilayah)
+            tampilkan_tabel(luar_wilayah_df, "koordinat_luar_wilayah", (sidik_upload, tuple(nama_region)),
+                            filter_kolom=("File", "Alasan"))
+            excel_luar = io.BytesIO()
+            luar_wilayah_df.to_excel(excel_luar, index=False, sheet_name="Koordinat Luar Wilayah")
+            excel_luar.seek(0)
+            st.download_button(
+                "Unduh Koordinat Di Luar Wilayah (Excel)",
+                data=excel_luar,
+                file_name="koordinat_luar_wilayah.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+
+        with st.expander("Screening calon pangkalan baru"):
+            if mode_hemat_memori:
+                st.info("Screening calon pangkalan membutuhkan seluruh data di memori sehingga tidak tersedia pada "
+                        "mode hemat memori.")
+            kandidat_file = st.file_uploader("Unggah CSV calon pangkalan (kolom Latitude dan Longitude)",
+                                             type=["csv"], key="kandidat_file", disabled=mode_hemat_memori)
+            batas_kandidat = st.number_input("Batas jarak minimal ke pangkalan eksisting (meter):",
+                                             min_value=1, max_value=10000, value=100, key="batas_kandidat")
+            sidik_kandidat = None
+            if kandidat_file is not None:
+                sidik_kandidat = (sidik_upload, kandidat_file.file_id, encoding_option, batas_kandidat)
+            if kandidat_file is not None and st.button("CEK CALON PANGKALAN"):
+                if "indeks_pangkalan" not in st.session_state:
+                    koordinat = [load_koordinat(koordinat_path[nama_file])[:2] for nama_file in data_region]
+                    st.session_state["indeks_pangkalan"] = IndeksPangkalan(
+                        pd.concat(data_region.values()),
+                        (np.concatenate([lat for lat, _ in koordinat]), np.concatenate([lon for _, lon in koordinat])))
+                try:
+                    kandidat_df = pd.read_csv(kandidat_file, encoding=encoding_option)
+                    hasil_kandidat = screen_candidates(st.session_state["indeks_pangkalan"], kandidat_df,
+                                                       batas_kandidat)
+                except Exception as e:
+                    st.session_state.pop("hasil_kandidat", None)
+                    st.error(f"Gagal memproses file calon pangkalan: {e}")
+                else:
+                    st.session_state["hasil_kandidat"] = (sidik_kandidat, hasil_kandidat)
+            tersimpan = st.session_state.get("hasil_kandidat")
+            if sidik_kandidat is not None and tersimpan is not None and tersimpan[0] == sidik_kandidat:
+                hasil_kandidat = tersimpan[1]
+                jumlah_dekat = int(hasil_kandidat["Status"].str.startswith("Di bawah").sum())
+                st.write(f"{jumlah_dekat} dari {len(hasil_kandidat)} calon pangkalan berjarak di bawah "
+                         f"{batas_kandidat} meter dari pangkalan eksisting.")
+                tampilkan_tabel(hasil_kandidat, "hasil_kandidat", sidik_kandidat, filter_kolom=("Status",))
+                excel_kandidat = io.BytesIO()
+                hasil_kandidat.to_excel(excel_kandidat, index=False, sheet_name="Screening Calon Pangkalan")
+                excel_kandidat.seek(0)
+                st.download_button(
+                    "Unduh Hasil Screening Calon Pangkalan (Excel)",
+                    data=excel_kandidat,
+                    file_name="screening_calon_pangkalan.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
         with st.form("validasi_form"):
             batas_meter = st.slider("Pilih batas jarak antar Pangkalan (meter):", 10, 1000, 100)
             batas_km = batas_meter / 1000
 
-            grouped = df.groupby(df.columns[soldtoparty_index])
-            max_length = max(len(group) for _, group in grouped)
+            if mode_hemat_memori:
+                max_length = max(ringkasan_region[nama_file].kelompok_terbesar for nama_file in nama_region)
+            else:
+                max_length = max(df.groupby(df.columns[soldtoparty_index]).size().max() for df in data_region.values())
             max_slider = max_length - 1 if max_length > 1 else 1
             slider_max = st.slider("Jumlah kolom Jarak yang ingin ditampilkan:", 1, max_slider,
                                    min(10, max_slider) if max_slider >= 10 else max_slider)
+            urut_spasial = st.checkbox(
+                "Urutkan pangkalan per Sold ID berdasarkan lokasi (kurva Hilbert) sebelum menghitung Jarak", value=False)
             submit = st.form_submit_button("PROSES VALIDASI")
 
         if not submit:
+            tampilkan_surat()
             st.stop()
 
-        word_files = []
-        all_group_dfs = []
-        rekap_distance_pairs = []
-
-        for soldtoparty, group in grouped:
-            group = group.reset_index(drop=True)
-            nama_agen = group.iloc[0, nama_agen_index]
-            koordinat = [
-                (
-                    clean_coordinate(row[lat_index]) or 0.0,
-                    clean_coordinate(row[lon_index]) or 0.0
-                )
-                for _, row in group.iterrows()
-            ]
-            n = len(koordinat)
-
-            for d in range(1, slider_max + 1):
-                jarak_list = []
-                for i in range(n):
-                    if i >= d:
-                        lat1, lon1 = koordinat[i - d]
-                        lat2, lon2 = koordinat[i]
-                        jarak_km = haversine(lat1, lon1, lat2, lon2)
-                        jarak_meter = round(jarak_km * 1000, 2)
-                        jarak_list.append(jarak_meter)
-                    else:
-                        jarak_list.append("")
-                group[f'Jarak {d} (m)'] = jarak_list
-
-            all_group_dfs.append(group)
-
-            rekap_bawah = []
-            pangkalan_terlibat = set()
-
-            for d in range(1, slider_max + 1):
-                for i in range(n):
-                    if i >= d:
-                        jarak = group.loc[i, f'Jarak {d} (m)']
-                        if jarak != "" and jarak < batas_meter:
-                            pangkalan_1 = group.loc[i - d, group.columns[nama_pangkalan_index]]
-                            pangkalan_2 = group.loc[i, group.columns[nama_pangkalan_index]]
-                            pair_key = frozenset([pangkalan_1, pangkalan_2])
-
-                            if not any(d['pair'] == pair_key and d['nama_agen'] == nama_agen for d in rekap_distance_pairs):
-                                rekap_distance_pairs.append({
-                                    'pair': pair_key,
-                                    'pangkalan_1': pangkalan_1,
-                                    'pangkalan_2': pangkalan_2,
-                                    'jarak': jarak,
-                                    'nama_agen': nama_agen,
-                                    'field_jarak': d
-                                })
-
-                            rekap_bawah.append({
-                                "pangkalan_1": pangkalan_1,
-                                "pangkalan_2": pangkalan_2,
-                                "jarak": jarak
-                            })
-
-                            pangkalan_terlibat.add(pangkalan_1)
-                            pangkalan_terlibat.add(pangkalan_2)
-
-            if rekap_bawah:
-                doc = Document()
-                style = doc.styles['Normal']
-                font = style.font
-                font.name = 'Arial'
-                font.size = Pt(12)
-
-                def add_paragraph_justify(text):
-                    p = doc.add_paragraph(text)
-                    p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                    p.paragraph_format.space_after = Pt(0)
-
-                doc.add_paragraph("Medan, Januari 2025").alignment = WD_ALIGN_PARAGRAPH.LEFT
-                doc.add_paragraph("No. /PND430000/2025-S3").alignment = WD_ALIGN_PARAGRAPH.LEFT
-                doc.add_paragraph("Lampiran:")
-
-                perihal_paragraph = doc.add_paragraph()
-                formatted_agen = format_agent_name(nama_agen)
-                run_perihal = perihal_paragraph.add_run(f"Perihal: Evaluasi Data Pangkalan {formatted_agen} pada SIMELON")
-                run_perihal.bold = True
-                perihal_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                doc.add_paragraph("Yang terhormat")
-                doc.add_paragraph(f"Pimpinan {formatted_agen}")
-                doc.add_paragraph("Di Tempat")
-
-                add_paragraph_justify("\nDengan hormat,")
-                add_paragraph_justify("\nDalam rangka menjamin kemudahan akses masyarakat untuk mendapatkan LPG 3 Kg...")
-                add_paragraph_justify(
-                    f"\nHasil evaluasi tersebut ditemukan bahwa terdapat pangkalan dengan titik lokasi dibawah {batas_meter} meter yaitu:")
-
-                G = nx.Graph()
-                for item in rekap_distance_pairs:
-                    # Only add edges for this agent's pairs
-                    if item['nama_agen'] == nama_agen:
-                        G.add_edge(item['pangkalan_1'], item['pangkalan_2'])
-
-                connected_components = list(nx.connected_components(G))
-
-                pangkalan_terpakai = set()
-                nomor = 1
-
-                for comp in connected_components:
-                    if any(p in pangkalan_terpakai for p in comp):
-                        continue
-                    pangkalan_terpakai.update(comp)
-                    pangkalan_list_sorted = sorted(comp, key=lambda x: x.lower())
-                    teks = f"{nomor}. Pangkalan " + ", Pangkalan ".join(pangkalan_list_sorted)
-                    add_paragraph_justify(teks)
-                    nomor += 1
-
-                add_paragraph_justify("\nSehubungan dengan hal tersebut, maka kami minta Saudara melakukan evaluasi berupa:")
-                add_paragraph_justify(
-                    "1. Memastikan kembali titik lokasi pangkalan sesuai dengan kondisi riil lapangan dan mengupdate pada Web SIMELON.")
-                add_paragraph_justify(
-                    "2. Apabila pangkalan benar pada titik lokasi yang sama, maka segera lakukan pemindahan lokasi salah satu pangkalan.")
-                add_paragraph_justify(
-                    "\nSelanjutnya agar Saudara segera menindaklanjuti temuan tersebut dan melaporkan kembali kepada kami dalam waktu 1 bulan kedepan.")
-
-                add_paragraph_justify("\nDemikian disampaikan, atas perhatian dan kerjasamanya kami ucapkan terima kasih.")
-                doc.add_paragraph("\nRegion Manager Retail Sales Sumbagut")
-                doc.add_paragraph("Edith Indra Triyadi")
-
-                buffer = io.BytesIO()
-                doc.save(buffer)
-                buffer.seek(0)
-                filename = f"Evaluasi Data Pangkalan {nama_agen}.docx"
-                word_files.append((filename, buffer.read()))
-
-        st.session_state["hasil_df"] = pd.concat(all_group_dfs, ignore_index=True)
-        st.session_state["word_files"] = word_files
-
-        if rekap_distance_pairs:
-            list_rekap = []
-            pangkalan_unique = set()
-            for item in rekap_distance_pairs:
-                list_rekap.append({
-                    'Pangkalan 1': item['pangkalan_1'],
-                    'Pangkalan 2': item['pangkalan_2'],
-                    'Jarak (m)': item['jarak'],
-                    'Nama Agen': item['nama_agen'],
-                    'Field Jarak': item['field_jarak']
-                })
-                pangkalan_unique.add(item['pangkalan_1'])
-                pangkalan_unique.add(item['pangkalan_2'])
-
-            df_rekap_pair = pd.DataFrame(list_rekap)
-
-            summary_text = f"\nRekapitulasi:\nJumlah pasangan pangkalan dengan jarak di bawah {batas_meter} meter: {len(df_rekap_pair)}\nJumlah pangkalan unik yang terlibat: {len(pangkalan_unique)}\n"
-
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                df_final = st.session_state["hasil_df"]
-                df_final.to_excel(writer, index=False, sheet_name='Hasil Validasi')
-                df_rekap_pair.to_excel(writer, index=False, sheet_name='Rekap Pasangan Pangkalan')
-
-                rekap_2 = []
-                for item in rekap_distance_pairs:
-                    rekap_2.append({
-                        'Nama Pangkalan 1': item['pangkalan_1'],
-                        'Nama Pangkalan 2': item['pangkalan_2'],
-                        'Selisih Jarak (m)': item['jarak'],
-                        'Field Jarak': item['field_jarak']
-                    })
-                df_rekap_2 = pd.DataFrame(rekap_2)
-                df_rekap_2.to_excel(writer, index=False, sheet_name='rekap-2')
-
-                workbook = writer.book
-                worksheet_main = writer.sheets['Hasil Validasi']
-                worksheet_rekap = writer.sheets['Rekap Pasangan Pangkalan']
-                worksheet_rekap_2 = writer.sheets['rekap-2']
-
-                format_highlight = workbook.add_format({'font_color': 'red', 'bg_color': '#FFFF00'})
-                format_pangkalan = workbook.add_format({'font_color': 'blue', 'bold': True})
-
-                jarak_cols = [col for col in df_final.columns if col.startswith("Jarak ")]
-                for col_index, col_name in enumerate(df_final.columns):
-                    if col_name in jarak_cols:
-                        for row_idx, value in enumerate(df_final[col_name]):
-                            if isinstance(value, (int, float)) and value < batas_meter:
-                                worksheet_main.write(row_idx + 1, col_index, value, format_highlight)
-
-                pangkalan_terlibat = set()
-                for item in rekap_distance_pairs:
-                    pangkalan_terlibat.add(item['pangkalan_1'])
-                    pangkalan_terlibat.add(item['pangkalan_2'])
-
-                for row_idx in range(len(df_final)):
-                    pangkalan_name = df_final.iloc[row_idx, nama_pangkalan_index]
-                    if pangkalan_name in pangkalan_terlibat:
-                        worksheet_main.write(row_idx + 1, nama_pangkalan_index, pangkalan_name, format_pangkalan)
-
-                last_row = len(df_rekap_pair) + 2
-                worksheet_rekap.write(last_row, 0, summary_text)
-
-            excel_buffer.seek(0)
+        if mode_hemat_memori:
+            hasil_sharded = []
+            progress = st.progress(0.0, text="Memproses shard...")
+            with ProcessPoolExecutor(max_workers=WORKER_SHARD,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                for nama_file in nama_region:
+                    try:
+                        hasil_sharded.append(process_sharded(
+                            nama_file, sumber_region[nama_file], encoding_option, batas_meter, slider_max, urut_spasial,
+                            executor=executor, ringkasan=ringkasan_region[nama_file],
+                            progres=lambda selesai, total, nama_file=nama_file: progress.progress(
+                                selesai / total, text=f"{nama_file}: {selesai}/{total} shard selesai")))
+                    except Exception as e:
+                        st.error(f"Gagal memproses file {nama_file}: {e}")
+            if not hasil_sharded:
+                st.stop()
 
+            st.session_state["hasil_df"] = None
+            st.session_state["temuan"] = {hasil.nama_file: hasil.temuan for hasil in hasil_sharded if hasil.temuan}
+            st.session_state["batas_meter_surat"] = batas_meter
+            st.session_state["arsip_surat"] = {}
+
+            try:
+                excel_filename, excel_buffer = build_workbook_sharded(hasil_sharded, batas_meter)
+            finally:
+                for hasil in hasil_sharded:
+                    remove_sharded_result(hasil)
             st.download_button(
-                "Unduh hasil_jarak_format_dan_rekap.xlsx",
+                f"Unduh {excel_filename}",
                 data=excel_buffer,
-                file_name="hasil_jarak_format_dan_rekap.xlsx",
+                file_name=excel_filename,
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
+            st.info("Ekspor GeoJSON/GeoParquet tidak dibuat pada mode hemat memori.")
+            tampilkan_surat()
+            st.stop()
+
+        hasil_region = {}
+        if multi_region:
+            progress = st.progress(0.0, text="Memproses file...")
+            max_workers = min(len(data_region), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {
+                    executor.submit(process_region, nama_file, df, batas_meter, slider_max, urut_spasial,
+                                    koordinat_path[nama_file]): nama_file
+                    for nama_file, df in data_region.items()
+                }
+                for selesai, future in enumerate(as_completed(futures), start=1):
+                    nama_file = futures[future]
+                    try:
+                        hasil_region[nama_file] = future.result()
+                    except Exception as e:
+                        st.error(f"Gagal memproses file {nama_file}: {e}")
+                    progress.progress(selesai / len(futures), text=f"{selesai}/{len(futures)} file selesai ({nama_file})")
+            if not hasil_region:
+                st.stop()
         else:
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                df_final = st.session_state["hasil_df"]
-                df_final.to_excel(writer, index=False, sheet_name='Hasil Validasi')
-                workbook = writer.book
-                worksheet = writer.sheets['Hasil Validasi']
-                format_highlight = workbook.add_format({'font_color': 'red', 'bg_color': '#FFFF00'})
-                jarak_cols = [col for col in df_final.columns if col.startswith("Jarak ")]
-                for col_index, col_name in enumerate(df_final.columns):
-                    if col_name in jarak_cols:
-                        for row_idx, value in enumerate(df_final[col_name]):
-                            if isinstance(value, (int, float)) and value < batas_meter:
-                                worksheet.write(row_idx + 1, col_index, value, format_highlight)
-
-            excel_buffer.seek(0)
+            for nama_file, df in data_region.items():
+                hasil_region[nama_file] = process_region(nama_file, df, batas_meter, slider_max, urut_spasial,
+                                                         koordinat_path[nama_file])
+
+        hasil = merge_results([hasil_region[nama_file] for nama_file in data_region if nama_file in hasil_region])
+        st.session_state["hasil_df"] = hasil.hasil_df
+        st.session_state["temuan"] = {
+            nama_file: hasil_region[nama_file].temuan for nama_file in data_region
+            if nama_file in hasil_region and hasil_region[nama_file].temuan
+        }
+        st.session_state["batas_meter_surat"] = batas_meter
+        st.session_state["arsip_surat"] = {}
+
+        excel_filename, excel_buffer = build_workbook(hasil, batas_meter)
+        st.download_button(
+            f"Unduh {excel_filename}",
+            data=excel_buffer,
+            file_name=excel_filename,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+        # ekspor GIS baru dibuat saat tombolnya diklik
+        st.download_button(
+            "Unduh Titik dan Pasangan Pangkalan (GeoJSON)",
+            data=lambda: build_geojson(hasil),
+            file_name="hasil_jarak.geojson",
+            mime="application/geo+json",
+            on_click="ignore"
+        )
+        if PYARROW_TERSEDIA:
             st.download_button(
-                "Unduh hasil_jarak_format.xlsx",
-                data=excel_buffer,
-                file_name="hasil_jarak_format.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                "Unduh Titik dan Pasangan Pangkalan (GeoParquet, ZIP)",
+                data=lambda: build_geoparquet(hasil),
+                file_name="hasil_jarak_geoparquet.zip",
+                mime="application/zip",
+                on_click="ignore"
             )
 
-if st.session_state.get("word_files"):
-    zip_buffer = io.BytesIO()
-    with ZipFile(zip_buffer, "w") as zip_file:
-        for filename, data in st.session_state["word_files"]:
-            zip_file.writestr(filename, data)
-    zip_buffer.seek(0)
-    st.download_button(
-        "Unduh Semua Rekap Agen (ZIP)",
-        data=zip_buffer,
-        file_name="rekap_agen.zip",
-        mime="application/zip"
-    )
-
+tampilkan_surat()
@@ -0,0 +1,631 @@
+import argparse
+import csv
+import datetime
+import importlib.util
+import io
+import math
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import cek_koordinat_engine as engine
+from cek_koordinat_engine import (
+    soldtoparty_index, nama_agen_index, nama_pangkalan_index, provinsi_index, kota_index, lat_index, lon_index,
+    PRESISI_KOORDINAT_IDENTIK, WILAYAH_PATH, repair_coordinates, process_region, merge_results, build_letter,
+    letter_metadata, read_upload, CacheKoordinat
+)
+
+TANGGAL_SURAT = datetime.date(2025, 1, 1)
+MAKS_SELISIH = 5
+
+# (Latitude, Longitude, Latitude hasil, Longitude hasil, aturan Latitude); NaN = ditolak
+KASUS_PERBAIKAN = [
+    ("3.586341", "98.619104", 3.586341, 98.619104, ""),
+    ("3,618891", "98.6", 3.618891, 98.6, ""),
+    ("98.619104", "3.586341", 3.586341, 98.619104, "Tertukar"),
+    ("3601111", "98628171", 3.601111, 98.628171, "Titik desimal"),
+    ("-62000", "106.8", -6.2, 106.8, "Titik desimal"),
+    ("98628171", "3601111", 3.601111, 98.628171, "Titik desimal, Tertukar"),
+    ("3°36'04\"N", "98°37'00\"E", 3 + 36 / 60 + 4 / 3600, 98 + 37 / 60, "Format DMS"),
+    ("3 36 04", "98 37 00", 3 + 36 / 60 + 4 / 3600, 98 + 37 / 60, "Format DMS"),
+    ("6.2S", "106.8E", -6.2, 106.8, "Format DMS"),
+    ("LS 6°12'", "BT 106°48'", -6.2, 106.8, "Format DMS"),
+    ("3 30.5", "98.6", 3 + 30.5 / 60, 98.6, "Format DMS"),
+    ("98°37'E", "3°36'N", 3.6, 98 + 37 / 60, "Format DMS, Tertukar"),
+    ("3.6011 11", "98.6", np.nan, 98.6, ""),
+    ("3 30.5 10", "98.6", np.nan, 98.6, ""),
+    ("3°61'00\"", "98.6", np.nan, 98.6, ""),
+    ("3.6B", "98.6", np.nan, 98.6, ""),
+    ("3.6", "98.6N", 3.6, np.nan, ""),
+    ("3.6U", "98.6", np.nan, 98.6, ""),
+]
+
+def urutan_hilbert(koordinat, order=16):
+    # kurva Hilbert klasik (xy2d) per titik, ditulis terpisah dari hilbert_order() milik engine
+    skala = (1 << order) - 1
+
+    def normalisasi(nilai):
+        ada = [v for v in nilai if not math.isnan(v)]
+        if not ada or max(ada) == min(ada):
+            return [0] * len(nilai)
+        terkecil, rentang = min(ada), max(ada) - min(ada)
+        return [int(((terkecil if math.isnan(v) else v) - terkecil) / rentang * skala) for v in nilai]
+
+    def xy2d(x, y):
+        d = 0
+        s = 1 << (order - 1)
+        while s:
+            rx, ry = int(x & s > 0), int(y & s > 0)
+            d += s * s * ((3 * rx) ^ ry)
+            if not ry:
+                if rx:
+                    x, y = skala - x, skala - y
+                x, y = y, x
+            s >>= 1
+        return d
+
+    kunci = [xy2d(x, y) for x, y in zip(normalisasi([lon for _, lon in koordinat]),
+                                         normalisasi([lat for lat, _ in koordinat]))]
+    return sorted(range(len(koordinat)), key=kunci.__getitem__)
+
+# salinan beku aturan pembersihan koordinat, ditulis ulang per nilai dan tidak memakai fungsi engine
+REF_LAT = (-11.1, 6.1)
+REF_LON = (94.9, 141.1)
+REF_TOLERANSI = 0.05
+REF_HEMISFER = {"lat": ("N", "S", "LU", "LS"), "lon": ("E", "W", "BT", "BB", "T", "B")}
+REF_NEGATIF = ("S", "W", "LS", "BB", "B")
+REF_PENANDA = re.compile(r"[°º˚'′’\"″”]|^[NSEWUTB]|[NSEWUTB]$|LU|LS|BT|BB|\d\s+\d")
+REF_DMS = re.compile(
+    r"\s*(LU|LS|BT|BB|[NSEWUTB])?\s*(-?\d+(?:[.,]\d+)?)\s*(?:°|º|˚|\s|(?=\s*(?:LU|LS|BT|BB|[NSEWUTB])?\s*$))\s*"
+    r"(?:(\d+(?:[.,]\d+)?)\s*(?:'|′|’|\s)?\s*)?(?:(\d+(?:[.,]\d+)?)\s*(?:\"|″|”|'')?\s*)?(LU|LS|BT|BB|[NSEWUTB])?\s*")
+REF_ALIAS = {
+    "JAKARTA": "DKI JAKARTA",
+    "DAERAH KHUSUS IBUKOTA JAKARTA": "DKI JAKARTA",
+    "YOGYAKARTA": "DI YOGYAKARTA",
+    "DAERAH ISTIMEWA YOGYAKARTA": "DI YOGYAKARTA",
+    "NANGGROE ACEH DARUSSALAM": "ACEH",
+    "KEP RIAU": "KEPULAUAN RIAU",
+    "BANGKA BELITUNG": "KEPULAUAN BANGKA BELITUNG",
+    "KEP BANGKA BELITUNG": "KEPULAUAN BANGKA BELITUNG",
+    "NTB": "NUSA TENGGARA BARAT",
+    "NTT": "NUSA TENGGARA TIMUR",
+}
+
+def ref_haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def _kosong(nilai):
+    return nilai is None or (isinstance(nilai, float) and math.isnan(nilai))
+
+def ref_baca(nilai):
+    # hasil: (angka, huruf hemisfer, pola DMS cocok tetapi ditolak)
+    if _kosong(nilai):
+        return math.nan, "", False
+    teks = str(nilai).strip().upper()
+    if REF_PENANDA.search(teks):
+        cocok = REF_DMS.fullmatch(teks)
+        if cocok:
+            hemisfer_1, derajat, menit, detik, hemisfer_2 = cocok.groups()
+            pecahan = ((menit is not None and re.search("[.,]", derajat))
+                       or (detik is not None and menit is not None and re.search("[.,]", menit)))
+            derajat = float(derajat.replace(",", "."))
+            menit = float(menit.replace(",", ".")) if menit else 0.0
+            detik = float(detik.replace(",", ".")) if detik else 0.0
+            hemisfer = hemisfer_1 or hemisfer_2 or ""
+            hasil = abs(derajat) + menit / 60 + detik / 3600
+            if hemisfer in REF_NEGATIF or derajat < 0:
+                hasil = -hasil
+            if pecahan or menit >= 60 or detik >= 60:
+                return math.nan, hemisfer, True
+            return hasil, hemisfer, False
+    teks = str(nilai).strip().replace(",", ".")
+    if re.search(r"\d\s+\d", teks):
+        return math.nan, "", False
+    try:
+        return float(re.sub(r"[^0-9.\-]", "", teks)), "", False
+    except ValueError:
+        return math.nan, "", False
+
+def ref_pulihkan(nilai, rentang):
+    if math.isnan(nilai):
+        return math.nan
+    if rentang[0] <= nilai <= rentang[1]:
+        return nilai
+    if abs(nilai) >= 100:
+        for k in range(1, 10):
+            if rentang[0] <= nilai / 10**k <= rentang[1]:
+                return nilai / 10**k
+    return math.nan
+
+def ref_perbaiki(nilai_lat, nilai_lon):
+    baca = {"lat": ref_baca(nilai_lat), "lon": ref_baca(nilai_lon)}
+    tertukar = baca["lat"][1] in REF_HEMISFER["lon"] and baca["lon"][1] in REF_HEMISFER["lat"]
+    nilai = {}
+    for kolom, (angka, hemisfer, ditolak) in baca.items():
+        if ditolak or (hemisfer and hemisfer not in REF_HEMISFER[kolom] and not tertukar):
+            angka = math.nan
+        nilai[kolom] = angka
+    lat, lon = ref_pulihkan(nilai["lat"], REF_LAT), ref_pulihkan(nilai["lon"], REF_LON)
+    if not (math.isnan(lat) or math.isnan(lon)):
+        return lat, lon
+    lat_tukar, lon_tukar = ref_pulihkan(nilai["lon"], REF_LAT), ref_pulihkan(nilai["lat"], REF_LON)
+    if not (math.isnan(lat_tukar) or math.isnan(lon_tukar)):
+        return lat_tukar, lon_tukar
+    return nilai["lat"] if math.isnan(lat) else lat, nilai["lon"] if math.isnan(lon) else lon
+
+def ref_wilayah(nilai):
+    if _kosong(nilai):
+        return ""
+    teks = re.sub(r"[.\s]+", " ", str(nilai).upper()).strip()
+    teks = re.sub(r"^KAB ", "KABUPATEN ", re.sub(r"^(PROVINSI|PROV) ", "", teks))
+    return REF_ALIAS.get(teks, teks)
+
+def ref_tabel_wilayah():
+    provinsi, kota = {}, {}
+    with open(WILAYAH_PATH, encoding="utf-8", newline="") as f:
+        for baris in csv.DictReader(f):
+            bbox = tuple(float(baris[k]) for k in ("Lat Min", "Lat Max", "Lon Min", "Lon Max"))
+            if baris["Tingkat"] == "Provinsi":
+                provinsi[ref_wilayah(baris["Nama Provinsi"])] = bbox
+            else:
+                kota[ref_wilayah(baris["Nama Provinsi"]), ref_wilayah(baris["Nama Kota / Kabupaten"])] = bbox
+    return provinsi, kota
+
+def _di_luar(lat, lon, bbox):
+    lat_min, lat_max, lon_min, lon_max = bbox
+    return (lat < lat_min - REF_TOLERANSI or lat > lat_max + REF_TOLERANSI
+            or lon < lon_min - REF_TOLERANSI or lon > lon_max + REF_TOLERANSI)
+
+def ref_koordinat(df):
+    # koordinat bersih per baris; nilai yang tak terbaca menjadi NaN, titik lengkap di luar wilayahnya
+    # menjadi NaN di kedua kolom, sedangkan titik yang hanya terisi sebelah tetap menyimpan nilai sebelahnya
+    per_provinsi, per_kota = ref_tabel_wilayah()
+    lat_all, lon_all = np.full(len(df), np.nan), np.full(len(df), np.nan)
+    for i, baris in enumerate(df.itertuples(index=False)):
+        lat, lon = ref_perbaiki(baris[lat_index], baris[lon_index])
+        if not (math.isnan(lat) or math.isnan(lon)):
+            provinsi, kota = ref_wilayah(baris[provinsi_index]), ref_wilayah(baris[kota_index])
+            bbox = [per_kota.get((provinsi, kota)), per_provinsi.get(provinsi), (*REF_LAT, *REF_LON)]
+            if any(b is not None and _di_luar(lat, lon, b) for b in bbox):
+                continue
+        lat_all[i], lon_all[i] = lat, lon
+    return lat_all, lon_all
+
+def _nilai_koordinat(nilai):
+    # nilai asli yang tidak diperbaiki bisa terbaca sebagai teks atau angka tergantung isi file lainnya
+    if isinstance(nilai, str):
+        try:
+            return float(nilai)
+        except ValueError:
+            return nilai.strip()
+    return math.nan if nilai is None else float(nilai)
+
+def _sama(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+def referensi_region(df, batas_meter, slider_max, urut_spasial=False):
+    import networkx as nx
+
+    lat_all, lon_all = ref_koordinat(df)
+    # koordinat yang diharapkan di tabel hasil: nilai bersih, atau nilai asli bila tidak bisa dipakai
+    koordinat_hasil = {
+        i: (lat if not math.isnan(lat) else _nilai_koordinat(asli_lat),
+            lon if not math.isnan(lon) else _nilai_koordinat(asli_lon))
+        for i, lat, lon, asli_lat, asli_lon in zip(df.index.tolist(), lat_all.tolist(), lon_all.tolist(),
+                                                  df.iloc[:, lat_index].tolist(), df.iloc[:, lon_index].tolist())
+    }
+    urutan_id = []
+    jarak = {}
+    pasangan = set()
+    temuan = []
+    for _, group in df.groupby(df.columns[soldtoparty_index]):
+        id_group = group.index.to_numpy()
+        nama = group.iloc[:, nama_pangkalan_index].tolist()
+        koordinat = list(zip(lat_all[id_group].tolist(), lon_all[id_group].tolist()))
+        n = len(koordinat)
+        if urut_spasial and n > 2:
+            urutan = urutan_hilbert(koordinat)
+            id_group = id_group[urutan]
+            nama = [nama[i] for i in urutan]
+            koordinat = [koordinat[i] for i in urutan]
+
+        kelompok = {}
+        for i, (lat, lon) in enumerate(koordinat):
+            if not (math.isnan(lat) or math.isnan(lon)):
+                kelompok.setdefault((round(lat, PRESISI_KOORDINAT_IDENTIK), round(lon, PRESISI_KOORDINAT_IDENTIK)),
+                                    []).append(i)
+        identik_group = [rows for rows in kelompok.values() if len(rows) > 1]
+        kode = [-1] * n
+        for nomor, rows in enumerate(identik_group):
+            for i in rows:
+                kode[i] = nomor
+
+        jarak_baris = [[] for _ in range(n)]
+        G = nx.Graph()
+        for d in range(1, slider_max + 1):
+            for i in range(n):
+                if i < d:
+                    jarak_baris[i].append("")
+                    continue
+                nilai = round(ref_haversine(*koordinat[i - d], *koordinat[i]) * 1000, 2)
+                jarak_baris[i].append(nilai)
+                if nilai < batas_meter and (kode[i] < 0 or kode[i] != kode[i - d]):
+                    pasangan.add((id_group[i - d], id_group[i], nilai, d))
+                    G.add_edge(id_group[i - d], id_group[i])
+        urutan_id.extend(id_group.tolist())
+        jarak.update(zip(id_group.tolist(), map(tuple, jarak_baris)))
+
+        if G.number_of_edges() or identik_group:
+            nama_per_id = dict(zip(id_group, nama))
+            identik = [(sorted([nama[i] for i in rows], key=lambda x: x.lower()), *koordinat[rows[0]])
+                       for rows in identik_group]
+            klaster = [sorted([nama_per_id[i] for i in comp], key=lambda x: x.lower())
+                       for comp in nx.connected_components(G)]
+            temuan.append((group.iloc[0, nama_agen_index], identik, klaster))
+
+    return urutan_id, jarak, koordinat_hasil, pasangan, temuan
+
+def keluaran_engine(hasil, slider_max):
+    df = hasil.hasil_df
+    ids = df.index.to_numpy()
+    jarak = dict(zip(ids.tolist(), zip(*[df[f"Jarak {d} (m)"].tolist() for d in range(1, slider_max + 1)])))
+    koordinat = dict(zip(ids.tolist(), zip(map(_nilai_koordinat, df.iloc[:, lat_index].tolist()),
+                                           map(_nilai_koordinat, df.iloc[:, lon_index].tolist()))))
+    baris_1 = np.frombuffer(hasil.pairs.baris_1, dtype=np.int64)
+    baris_2 = np.frombuffer(hasil.pairs.baris_2, dtype=np.int64)
+    jarak_pasangan = np.round(np.frombuffer(hasil.pairs.jarak, dtype=np.float32).astype(np.float64), 2)
+    field = np.frombuffer(hasil.pairs.field_jarak, dtype=np.int16)
+    pasangan = set(zip(ids[baris_1].tolist(), ids[baris_2].tolist(), jarak_pasangan.tolist(), field.tolist()))
+    return ids.tolist(), jarak, koordinat, pasangan, hasil.temuan
+
+def _normalisasi_pasangan(pasangan):
+    # PairStore menyimpan jarak sebagai float32, jadi pembandingan dilakukan pada presisi yang sama
+    return {(int(a), int(b), round(float(np.float32(j)), 2), int(d)) for a, b, j, d in pasangan}
+
+def _normalisasi_temuan(temuan):
+    return {nama_agen: ([(nama, lat, lon) for nama, lat, lon in identik], sorted(klaster)) for nama_agen, identik, klaster
+            in temuan}
+
+def _teks_surat(temuan, batas_meter):
+    from docx import Document
+
+    metadata = letter_metadata("", tanggal=TANGGAL_SURAT)
+    teks = {}
+    for nama_agen, identik, klaster in temuan:
+        doc = Document(io.BytesIO(build_letter(nama_agen, batas_meter, identik, klaster, metadata)))
+        teks[nama_agen] = "\n".join(p.text for p in doc.paragraphs)
+    return teks
+
+def bandingkan(referensi, hasil, batas_meter):
+    selisih = []
+    urutan_ref, jarak_ref, koordinat_ref, pasangan_ref, temuan_ref = referensi
+    urutan, jarak, koordinat, pasangan, temuan = hasil
+
+    # baris dibandingkan per id pangkalan; urutan baris dicek terpisah
+    if urutan_ref != urutan:
+        beda = [i for i, (a, b) in enumerate(zip(urutan_ref, urutan)) if a != b]
+        selisih.append(f"Urutan baris: {len(urutan_ref)} vs {len(urutan)} baris, {len(beda)} posisi berbeda, "
+                       f"contoh posisi {beda[:MAKS_SELISIH]}")
+    for d in range(len(next(iter(jarak_ref.values()), ()))):
+        beda = [i for i in urutan_ref if i not in jarak or not _sama(jarak_ref[i][d], jarak[i][d])]
+        if beda:
+            selisih.append(f"Jarak {d + 1} (m): {len(beda)} baris berbeda, contoh id {beda[:MAKS_SELISIH]}")
+    beda = [i for i in urutan_ref if i not in koordinat
+            or not all(_sama(a, b) for a, b in zip(koordinat_ref[i], koordinat[i]))]
+    if beda:
+        selisih.append(f"Latitude/Longitude hasil: {len(beda)} baris berbeda, contoh "
+                       f"{[(i, koordinat_ref[i], koordinat.get(i)) for i in beda[:MAKS_SELISIH]]}")
+
+    pasangan_ref, pasangan = _normalisasi_pasangan(pasangan_ref), _normalisasi_pasangan(pasangan)
+    if pasangan_ref != pasangan:
+        selisih.append(f"Pasangan: {len(pasangan_ref - pasangan)} hilang {sorted(pasangan_ref - pasangan)[:MAKS_SELISIH]}, "
+                       f"{len(pasangan - pasangan_ref)} tambahan {sorted(pasangan - pasangan_ref)[:MAKS_SELISIH]}")
+
+    klaster_ref, klaster = _normalisasi_temuan(temuan_ref), _normalisasi_temuan(temuan)
+    beda_agen = sorted(a for a in klaster_ref.keys() | klaster.keys() if klaster_ref.get(a) != klaster.get(a))
+    if beda_agen:
+        selisih.append(f"Klaster/koordinat identik berbeda untuk {len(beda_agen)} agen: {beda_agen[:MAKS_SELISIH]}")
+
+    surat_ref, surat = _teks_surat(temuan_ref, batas_meter), _teks_surat(temuan, batas_meter)
+    beda_surat = sorted(a for a in surat_ref.keys() | surat.keys() if surat_ref.get(a) != surat.get(a))
+    if beda_surat:
+        selisih.append(f"Teks surat berbeda untuk {len(beda_surat)} agen: {beda_surat[:MAKS_SELISIH]}")
+    return selisih
+
+def engine_numpy(df, data, batas_meter, slider_max, urut_spasial):
+    numba_tersedia = engine.NUMBA_TERSEDIA
+    engine.NUMBA_TERSEDIA = False
+    try:
+        return process_region("regresi", df, batas_meter, slider_max, urut_spasial)
+    finally:
+        engine.NUMBA_TERSEDIA = numba_tersedia
+
+def engine_numba(df, data, batas_meter, slider_max, urut_spasial):
+    return process_region("regresi", df, batas_meter, slider_max, urut_spasial)
+
+def engine_cache(df, data, batas_meter, slider_max, urut_spasial):
+    with tempfile.TemporaryDirectory() as direktori:
+        cache = CacheKoordinat(direktori)
+        return process_region("regresi", df, batas_meter, slider_max, urut_spasial,
+                              koordinat_path=cache.ambil_atau_buat(data, "utf-8", df))
+
+_executor_shard = None
+
+def engine_shard(df, data, batas_meter, slider_max, urut_spasial):
+    # jalur yang sama dengan aplikasi: ringkasan scan_upload dan shard diproses di worker terpisah
+    global _executor_shard
+    if _executor_shard is None:
+        _executor_shard = ProcessPoolExecutor(max_workers=engine.WORKER_SHARD,
+                                              mp_context=multiprocessing.get_context("spawn"))
+    with tempfile.TemporaryDirectory() as direktori:
+        hasil = engine.process_sharded("regresi", data, "utf-8", batas_meter, slider_max, urut_spasial,
+                                       direktori=direktori, baris_per_shard=max(1, len(df) // 4),
+                                       executor=_executor_shard, ringkasan=engine.scan_upload(data, "utf-8"))
+        return engine.load_sharded_result(hasil)
+
+def engine_gabungan(df, data, batas_meter, slider_max, urut_spasial):
+    # Sold ID dibagi menjadi dua file region, diproses terpisah lalu digabung seperti unggahan multi-region
+    sold_id = df.iloc[:, soldtoparty_index]
+    unik = np.sort(sold_id.dropna().unique())
+    bagian = sold_id.isin(unik[:len(unik) // 2]).to_numpy()
+    hasil_list, id_asli = [], []
+    for nomor, pilih in enumerate((bagian, ~bagian)):
+        if not pilih.any():
+            continue
+        df_region = read_upload(df[pilih].to_csv(index=False).encode("utf-8"), "utf-8")
+        hasil_list.append(process_region(f"regresi-{nomor}", df_region, batas_meter, slider_max, urut_spasial))
+        id_asli.append(df.index.to_numpy()[pilih])
+    hasil = merge_results(hasil_list)
+    hasil.hasil_df.index = np.concatenate([ids[h.hasil_df.index.to_numpy()] for ids, h in zip(id_asli, hasil_list)])
+    return hasil
+
+ENGINE = {"numpy": engine_numpy, "cache": engine_cache, "shard": engine_shard, "gabungan": engine_gabungan}
+if engine.NUMBA_TERSEDIA:
+    ENGINE["numba"] = engine_numba
+
+def cek_perbaikan():
+    n = len(KASUS_PERBAIKAN)
+    df = pd.DataFrame({
+        "Sold ID": 731000,
+        "Nama Agen": "PT. AGEN NO 0",
+        "Nama Pangkalan": [f"Pangkalan{i}" for i in range(n)],
+        "Nama Provinsi": "SUMATERA UTARA",
+        "Nama Kota / Kabupaten": "KOTA MEDAN",
+        "Nama Kecamatan": "Medan0",
+        "Nama Kelurahan": "K",
+        "Alamat": "J",
+        "Latitude": [kasus[0] for kasus in KASUS_PERBAIKAN],
+        "Longitude": [kasus[1] for kasus in KASUS_PERBAIKAN],
+    })
+    lat, lon, laporan = repair_coordinates(df)
+    aturan = laporan[laporan["Kolom"] == "Latitude"].set_index("Baris")["Aturan"]
+    selisih = []
+    for i, (lat_awal, lon_awal, lat_ref, lon_ref, aturan_ref) in enumerate(KASUS_PERBAIKAN):
+        hasil = (lat[i], lon[i], aturan.get(i + 2, ""))
+        if not (np.allclose([lat[i], lon[i]], [lat_ref, lon_ref], rtol=0, atol=1e-9, equal_nan=True)
+                and hasil[2] == aturan_ref):
+            selisih.append(f"{lat_awal!r}, {lon_awal!r}: engine {hasil}, referensi {(lat_ref, lon_ref, aturan_ref)}")
+        # salinan beku di skrip ini juga harus memenuhi tabel yang sama
+        if not np.allclose(ref_perbaiki(lat_awal, lon_awal), [lat_ref, lon_ref], rtol=0, atol=1e-9, equal_nan=True):
+            selisih.append(f"{lat_awal!r}, {lon_awal!r}: ref_perbaiki {ref_perbaiki(lat_awal, lon_awal)}, "
+                           f"referensi {(lat_ref, lon_ref)}")
+    return selisih
+
+def cek_workbook(df, data, batas_meter, slider_max, urut_spasial):
+    # workbook mode hemat memori harus sama isinya dengan build_workbook pada hasil mode biasa
+    with tempfile.TemporaryDirectory() as direktori:
+        hasil = engine.process_sharded("regresi", data, "utf-8", batas_meter, slider_max, urut_spasial,
+                                       direktori=direktori, baris_per_shard=max(1, len(df) // 4))
+        try:
+            _, sharded = engine.build_workbook_sharded([hasil], batas_meter)
+        finally:
+            engine.remove_sharded_result(hasil)
+    _, biasa = engine.build_workbook(process_region("regresi", df, batas_meter, slider_max, urut_spasial),
+                                     batas_meter)
+    isi_biasa = pd.read_excel(biasa, sheet_name=None, header=None)
+    isi_sharded = pd.read_excel(sharded, sheet_name=None, header=None)
+    selisih = []
+    if list(isi_biasa) != list(isi_sharded):
+        selisih.append(f"Sheet: {list(isi_biasa)} vs {list(isi_sharded)}")
+    for nama in isi_biasa.keys() & isi_sharded.keys():
+        a, b = isi_biasa[nama], isi_sharded[nama]
+        if a.shape != b.shape:
+            selisih.append(f"Sheet {nama}: ukuran {a.shape} vs {b.shape}")
+            continue
+        beda = ~((a == b) | (a.isna() & b.isna())).to_numpy()
+        if beda.any():
+            selisih.append(f"Sheet {nama}: {int(beda.sum())} sel berbeda, contoh (baris, kolom) "
+                           f"{list(zip(*np.nonzero(beda)))[:MAKS_SELISIH]}")
+    return selisih
+
+def _titik_seri(lat, lon, jarak_cm):
+    # latitude berikutnya di meridian yang sama dengan jarak haversine tepat di tengah pembulatan (x.5 cm);
+    # dekat khatulistiwa selisih satu ulp latitude jauh lebih kecil dari AMBANG_PEMBULATAN
+    bawah, atas = lat, lat + 0.02
+    while True:
+        tengah = (bawah + atas) / 2
+        if tengah in (bawah, atas):
+            break
+        if ref_haversine(lat, lon, tengah, lon) * 1e5 < jarak_cm:
+            bawah = tengah
+        else:
+            atas = tengah
+    return min((bawah, atas), key=lambda x: abs(ref_haversine(lat, lon, x, lon) * 1e5 - jarak_cm))
+
+def data_pembulatan(seed, n, batas=(100, 800)):
+    rng = np.random.default_rng(seed)
+    lon = 100.0
+    lat = [0.001]
+    for i in range(1, n):
+        if i % 7 == 0:
+            # jarak tepat di batas: 99.995 m dibulatkan ke 99.99 atau 100.0 menentukan ada tidaknya pasangan
+            jarak_cm = batas[i // 7 % len(batas)] * 100 - 0.5
+        else:
+            jarak_cm = int(rng.integers(100, 90_000)) + 0.5
+        if lat[-1] > 0.8:
+            lat.append(0.001)
+            continue
+        lat.append(_titik_seri(lat[-1], lon, jarak_cm))
+    agen = np.arange(n) // 40
+    df = pd.DataFrame({
+        "Sold ID": 732000 + agen,
+        "Nama Agen": [f"PT. AGEN NO {a}" for a in agen],
+        "Nama Pangkalan": [f"Pangkalan{i}" for i in range(n)],
+        "Nama Provinsi": "SUMATERA BARAT",
+        "Nama Kota / Kabupaten": "KABUPATEN PASAMAN",
+        "Nama Kecamatan": "Kecamatan0",
+        "Nama Kelurahan": "K",
+        "Alamat": "J",
+        "Latitude": [repr(x) for x in lat],
+        "Longitude": lon,
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+def cek_pembulatan(data, slider_max):
+    # numba dan numpy harus sama persis dengan round(haversine() * 1000, 2) termasuk di titik tengah pembulatan
+    df = read_upload(data, "utf-8")
+    lat, lon = ref_koordinat(df)
+    n = len(lat)
+    kode = np.full(n, -1, dtype=np.int64)
+    referensi = np.full((slider_max, n), np.nan)
+    tengah = 0
+    for d in range(1, slider_max + 1):
+        for i in range(d, n):
+            skala = ref_haversine(lat[i - d], lon[i - d], lat[i], lon[i]) * 1e5
+            tengah += abs(skala - math.floor(skala) - 0.5) < engine.AMBANG_PEMBULATAN
+            referensi[d - 1, i] = round(ref_haversine(lat[i - d], lon[i - d], lat[i], lon[i]) * 1000, 2)
+    selisih = []
+    for nama_engine, pakai_numba in (("numpy", False), ("numba", True)):
+        if pakai_numba and not engine.NUMBA_TERSEDIA:
+            continue
+        buffer, _ = engine.hitung_jarak_window(lat, lon, kode, slider_max, 100, pakai_numba)
+        beda = np.flatnonzero((buffer != referensi) & ~(np.isnan(buffer) & np.isnan(referensi)))
+        if len(beda):
+            selisih.append(f"{nama_engine}: {len(beda)} nilai Jarak berbeda dari round(haversine())")
+    return tengah, selisih
+
+def data_sintetis(seed, n):
+    rng = np.random.default_rng(seed)
+    agen = rng.integers(0, max(1, n // 150), n)
+    lat = 3.58 + rng.random(n) * 0.05
+    lon = 98.6 + rng.random(n) * 0.05
+    duplikat = rng.random(n) < 0.08
+    sumber = rng.integers(0, n, n)
+    lat[duplikat], lon[duplikat] = lat[sumber[duplikat]], lon[sumber[duplikat]]
+    dekat = rng.random(n) < 0.05
+    lat[dekat] = lat[sumber[dekat]] + rng.normal(0, 2e-6, dekat.sum())
+    lon[dekat] = lon[sumber[dekat]] + rng.normal(0, 2e-6, dekat.sum())
+
+    latitude = np.round(lat, 6).astype(object)
+    longitude = np.round(lon, 6).astype(object)
+    kotor = rng.choice(n, size=max(1, n // 50), replace=False)
+
+    def dms(nilai, hemisfer):
+        derajat, sisa = divmod(abs(nilai) * 3600, 3600)
+        menit, detik = divmod(sisa, 60)
+        return f"{int(derajat)}°{int(menit)}'{detik:.2f}\"{hemisfer}"
+    for nomor, i in enumerate(kotor):
+        jenis = nomor % 6
+        if jenis == 0:
+            latitude[i] = f"{latitude[i]}".replace(".", ",")
+        elif jenis == 1:
+            latitude[i], longitude[i] = longitude[i], latitude[i]
+        elif jenis == 2:
+            longitude[i] = f"{longitude[i]:.6f}".replace(".", "")
+        elif jenis == 3:
+            latitude[i] = None
+        elif jenis == 4:
+            latitude[i], longitude[i] = 0, 0
+        else:
+            latitude[i], longitude[i] = dms(latitude[i], "N"), "BT " + dms(longitude[i], "")
+
+    df = pd.DataFrame({
+        "Sold ID": 731000 + agen,
+        "Nama Agen": [f"PT. AGEN NO {a}" for a in agen],
+        "Nama Pangkalan": [f"Pangkalan{i % max(1, n - n // 20)}" for i in range(n)],
+        "Nama Provinsi": "SUMATERA UTARA",
+        "Nama Kota / Kabupaten": "KOTA MEDAN",
+        "Nama Kecamatan": [f"Medan{a % 3}" for a in agen],
+        "Nama Kelurahan": "K",
+        "Alamat": "J",
+        "Latitude": latitude,
+        "Longitude": longitude,
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bandingkan keluaran engine cek koordinat dengan loop referensi (kolom Jarak, pasangan, "
+                    "klaster dan teks surat)")
+    parser.add_argument("csv", nargs="*", help="dataset tambahan (format template, sebaiknya sudah dianonimkan)")
+    parser.add_argument("--sintetis", type=int, default=6, help="jumlah dataset sintetis")
+    parser.add_argument("--baris", type=int, default=1500, help="jumlah baris per dataset sintetis")
+    parser.add_argument("--batas", type=float, nargs="+", default=[100, 800])
+    parser.add_argument("--kolom", type=int, default=20, help="jumlah kolom Jarak (slider)")
+    parser.add_argument("--engine", nargs="+", choices=sorted(ENGINE), default=sorted(ENGINE))
+    parser.add_argument("--urut-spasial", choices=["tidak", "ya", "keduanya"], default="keduanya",
+                        help="jalankan tanpa dan/atau dengan pengurutan kurva Hilbert per Sold ID")
+    args = parser.parse_args()
+
+    korpus = [(f"sintetis-{seed}", data_sintetis(seed, args.baris)) for seed in range(args.sintetis)]
+    korpus.append(("pembulatan", data_pembulatan(0, args.baris)))
+    for path in args.csv:
+        with open(path, "rb") as f:
+            korpus.append((os.path.basename(path), f.read()))
+
+    daftar_urut = {"tidak": [False], "ya": [True], "keduanya": [False, True]}[args.urut_spasial]
+
+    selisih = cek_perbaikan()
+    print(f"aturan perbaikan koordinat: {'OK' if not selisih else 'BERBEDA'} ({len(KASUS_PERBAIKAN)} kasus)")
+    for baris in selisih:
+        print(f"    {baris}")
+    gagal = bool(selisih)
+    tengah, selisih = cek_pembulatan(korpus[-1][1], args.kolom)
+    print(f"pembulatan numba/numpy vs haversine(): {'OK' if not selisih else 'BERBEDA'} "
+          f"({tengah} jarak di titik tengah pembulatan)")
+    for baris in selisih:
+        print(f"    {baris}")
+    gagal += bool(selisih)
+    # isi workbook dibaca ulang dengan openpyxl (lewat pandas) bila terpasang
+    baca_excel = importlib.util.find_spec("openpyxl") is not None
+    if "shard" in args.engine and not baca_excel:
+        print("openpyxl tidak terpasang: pembandingan workbook mode hemat memori dilewati")
+    for nama, data in korpus:
+        df = read_upload(data, "utf-8")
+        for batas_meter in args.batas:
+            for urut_spasial in daftar_urut:
+                referensi = referensi_region(df, batas_meter, args.kolom, urut_spasial)
+                for nama_engine in args.engine:
+                    hasil = keluaran_engine(ENGINE[nama_engine](df.copy(), data, batas_meter, args.kolom, urut_spasial),
+                                            args.kolom)
+                    selisih = bandingkan(referensi, hasil, batas_meter)
+                    status = "OK" if not selisih else "BERBEDA"
+                    print(f"{nama} batas={batas_meter:g}{' hilbert' if urut_spasial else ''} engine={nama_engine}: "
+                          f"{status} ({len(referensi[3])} pasangan, {len(referensi[4])} agen dengan temuan)")
+                    for baris in selisih:
+                        print(f"    {baris}")
+                    gagal += bool(selisih)
+                if "shard" in args.engine and baca_excel:
+                    selisih = cek_workbook(df, data, batas_meter, args.kolom, urut_spasial)
+                    print(f"{nama} batas={batas_meter:g}{' hilbert' if urut_spasial else ''} "
+                          f"build_workbook_sharded vs build_workbook: {'OK' if not selisih else 'BERBEDA'}")
+                    for baris in selisih:
+                        print(f"    {baris}")
+                    gagal += bool(selisih)
+    if _executor_shard is not None:
+        _executor_shard.shutdown()
+    sys.exit(1 if gagal else 0)
+
+if __name__ == "__main__":
+    main()
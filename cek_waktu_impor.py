@@ -0,0 +1,45 @@
+import argparse
+import json
+import subprocess
+import sys
+
+MODUL = ["cek_koordinat_engine", "cek_koordinat_api"]
+MODUL_BERAT = ["docx", "networkx", "xlsxwriter", "scipy", "numba", "plotly"]
+BATAS_DETIK = 1.5
+
+KODE_UKUR = """
+import json, sys, time
+mulai = time.perf_counter()
+for nama in {modul!r}:
+    __import__(nama)
+durasi = time.perf_counter() - mulai
+print(json.dumps({{"durasi": durasi, "termuat": [m for m in {berat!r} if m in sys.modules]}}))
+"""
+
+def ukur(modul, ulang):
+    hasil = []
+    for _ in range(ulang):
+        keluaran = subprocess.run([sys.executable, "-c", KODE_UKUR.format(modul=modul, berat=MODUL_BERAT)],
+                                  capture_output=True, text=True, check=True)
+        hasil.append(json.loads(keluaran.stdout.strip().splitlines()[-1]))
+    return min(hasil, key=lambda h: h["durasi"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark waktu impor modul aplikasi cek koordinat")
+    parser.add_argument("--batas", type=float, default=BATAS_DETIK, help="batas waktu impor (detik)")
+    parser.add_argument("--ulang", type=int, default=5)
+    args = parser.parse_args()
+
+    hasil = ukur(MODUL, args.ulang)
+    print(f"Waktu impor {', '.join(MODUL)}: {hasil['durasi']:.3f} detik (batas {args.batas:.3f} detik)")
+    gagal = False
+    if hasil["termuat"]:
+        print(f"Library berat ikut termuat saat start: {', '.join(hasil['termuat'])}")
+        gagal = True
+    if hasil["durasi"] > args.batas:
+        print("Waktu impor melebihi batas")
+        gagal = True
+    sys.exit(1 if gagal else 0)
+
+if __name__ == "__main__":
+    main()